@@ -1,5 +1,6 @@
-import pandas as pd
+import functools
 import json
+import os
 import folium
 from folium import plugins
 import branca.colormap as cm
@@ -8,21 +9,54 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import dash
 from dash import dcc, html
+from dash import Patch
 from dash.dependencies import Input, Output
-import numpy as np
 from datetime import datetime
 import calendar
-from pathlib import Path
 import branca.element as be
+from accident_data import AccidentData
+from data_watcher import WATCH_INTERVAL, DataWatcher
+from figure_cache import FigureCache
+from map_cache import MapCache
+from shared_cache import register_stats_route
+from warm_up import WarmUp, register_ready_route
+from zone_geometry import detail_for_zoom, load_zone_lod
+
+# Categories the severity chart can be broken down by
+CATEGORY_OPTIONS = [
+    {'label': 'Nationality Group', 'value': 'NATIONALITY_GROUP_OF_ACCIDENT_'},
+    {'label': 'Accident Nature', 'value': 'ACCIDENT_NATURE'},
+    {'label': 'Accident Reason', 'value': 'ACCIDENT_REASON'}
+]
 
 class QatarAccidentsDashboard:
-    def __init__(self, accidents_file='facc.csv', polygons_file='qatar_zones_polygons.json'):
+    def __init__(self, accidents_file='facc.csv', polygons_file='qatar_zones_polygons.json', preload_maps=False, map_detail=None,
+                 map_mode=None, preload_figures=False):
         self.accidents_file = accidents_file
         self.polygons_file = polygons_file
-        self.df = None
-        self.zones_data = None
+        self.data = None
+        self.watcher = None
+        self.warm_up = None
+        self.zone_shapes = None
+        self.map_detail = map_detail
         self.zone_names = self.initialize_zone_names()
-        self.current_year = None
+        self.preload_maps = preload_maps
+        self.preload_figures = preload_figures
+        
+        # Rendered maps are cached per (year, theme, data version) so year switches skip folium
+        self.map_theme = 'dark'
+        self.map_cache = MapCache(self.create_map)
+        
+        self.figures = FigureCache()
+        
+        # 'folium' ships a rendered iframe per year; 'geojson' ships the zone
+        # geometry once and only patches the per-zone counts on year change.
+        # Defaults to the TRAFFIQ_MAP_MODE environment variable, then 'folium'.
+        self.map_mode = map_mode or os.environ.get('TRAFFIQ_MAP_MODE', 'folium')
+        if self.map_mode not in ('folium', 'geojson'):
+            raise ValueError(f'Unknown map mode: {self.map_mode}')
+        self.map_colors = ['#ff00ff', '#00ffff', '#ff0000']
+        self.map_style = 'carto-darkmatter'
         
         # Color scheme
         self.colors = {
@@ -47,44 +81,67 @@ class QatarAccidentsDashboard:
 
         
     def load_data(self):
-        # Load accidents data
-        self.df = pd.read_csv(self.accidents_file, skipinitialspace=True)
-        
-        # Clean data
-        self.df['ZONE'] = self.df['ZONE'].astype(str).str.strip()
-        self.df['ZONE'] = self.df['ZONE'].apply(lambda x: 
-            str(int(float(x))) if x.replace('.', '').isdigit() else 'Unknown')
+        # Cleaned accidents with their year index and cube, mapped from the shared
+        # data plane so every worker reads one copy instead of loading its own
+        self.data = AccidentData(self.accidents_file)
         
-        # Convert time to hour
-        self.df['HOUR'] = self.df['ACCIDENT_TIME'].str.extract('(\d+)').astype(float)
-        
-        # Set current year to the most recent year
-        self.current_year = self.df['ACCIDENT_YEAR'].max()
-        
-        # Load polygon data
+        # Load simplified, quantized polygon data
         try:
-            with open(self.polygons_file, 'r') as f:
-                self.zones_data = json.load(f)
-        except:
-            print("Warning: Could not load polygon data")
+            self.zone_shapes = load_zone_lod(self.polygons_file)
+        except Exception as e:
+            print(f"Warning: Could not load polygon data: {e}")
+
+    def reload_data(self):
+        data = AccidentData(self.accidents_file)
+        if self.preload_maps and self.map_mode != 'geojson':
+            self.warm_maps(data)
+        self.data = data
+        # Maps of older versions are never asked for again
+        self.map_cache.retain(data.version)
+        if self.preload_figures:
+            self.figures.warm()
+
+    def map_html(self, year, data):
+        """Cached map of one snapshot's year"""
+        return self.map_cache.get(year, self.map_theme, data.version,
+                                  lambda year: self.create_map(year, data=data))
 
-    def create_map(self, year):
+    def warm_maps(self, data):
+        for year in data.year_index.years:
+            self.map_html(year, data)
+
+    def warm_up_stages(self):
+        data = self.data
+        stages = {'metrics': lambda: self.calculate_metrics(data)}
+        if self.map_mode != 'geojson':
+            # The initial year always, every year when preloading
+            years = data.year_index.years if self.preload_maps else [data.current_year]
+            for year in years:
+                stages[f'map {int(year)}'] = functools.partial(self.map_html, year, data)
+        if self.preload_figures:
+            stages['figures'] = self.figures.warm
+        return stages
+
+    def create_map(self, year, detail=None, data=None):
         # Create base map
+        zoom_start = 11
         m = folium.Map(
             location=[25.2867, 51.5333],
-            zoom_start=11,
+            zoom_start=zoom_start,
             tiles='CartoDB dark_matter',
             prefer_canvas=True
         )
         
         # Get accident counts for the selected year
-        year_data = self.df[self.df['ACCIDENT_YEAR'] == year]
-        zone_counts = year_data['ZONE'].value_counts().to_dict()
+        zone_counts = self.year_zone_counts(year, data).to_dict()
         max_count = max(zone_counts.values()) if zone_counts else 1
         
+        # Full-resolution outlines are invisible at city zoom, so ship a coarser level
+        detail = detail or self.map_detail or detail_for_zoom(zoom_start)
+        
         # Create color scale
         colormap = cm.LinearColormap(
-            colors=['#ff00ff', '#00ffff', '#ff0000'],
+            colors=self.map_colors,
             vmin=0,
             vmax=max_count
         )
@@ -96,11 +153,10 @@ class QatarAccidentsDashboard:
                     continue
                     
                 zone_int = str(int(float(zone)))
-                zone_data = self.zones_data.get(zone_int)
+                coordinates = self.zone_shapes.get(zone_int, detail)
                 zone_name = self.zone_names.get(zone_int, f'Zone {zone_int}')
                 
-                if zone_data:
-                    coordinates = [[p['lat'], p['lng']] for p in zone_data['coordinates']]
+                if coordinates:
                     opacity = 0.2 + (count / max_count * 0.8)
                     
                     folium.Polygon(
@@ -119,43 +175,77 @@ class QatarAccidentsDashboard:
         # Add the color scale
         colormap.add_to(m)
         
-        # Save the map to HTML
-        map_path = 'assets/map.html'
-        m.save(map_path)
-        return map_path
+        # Render the map straight to an HTML string; nothing touches disk, so
+        # concurrent callbacks in threads or workers cannot clobber each other
+        return m.get_root().render()
+
+    def year_zone_counts(self, year, data=None):
+        """Accidents per zone for a year, zones without accidents left out"""
+        return (data or self.data).cube.marginal(['ZONE'], where={'ACCIDENT_YEAR': year})
+
+    def zone_count_vector(self, year, data=None):
+        """Accidents per geometry zone for a year, None where a zone had none"""
+        zone_counts = self.year_zone_counts(year, data)
+        zone_counts.index = zone_counts.index.astype(str)
+        counts = zone_counts.reindex(self.zone_shapes.zone_ids, fill_value=0)
+        return [int(count) if count > 0 else None for count in counts]
 
-    def create_dashboard(self):
-        app = dash.Dash(__name__)
+    def create_choropleth(self, year, detail=None, data=None):
+        """Client-side choropleth whose geometry never changes after the first render"""
+        detail = detail or self.map_detail or detail_for_zoom(11)
+        zone_ids = self.zone_shapes.zone_ids
+        z = self.zone_count_vector(year, data)
         
-        # Calculate metrics before creating layout
-        metrics = self.calculate_metrics()
+        fig = go.Figure(go.Choroplethmap(
+            geojson=self.zone_shapes.to_geojson(detail),
+            locations=zone_ids,
+            z=z,
+            zmin=0,
+            zmax=max([count for count in z if count] or [1]),
+            colorscale=self.map_colors,
+            marker_line_width=0,
+            marker_opacity=0.8,
+            text=[self.zone_names.get(zone_id, f'Zone {zone_id}') for zone_id in zone_ids],
+            hovertemplate='%{text}<br>Accidents: %{z}<extra></extra>'
+        ))
+        fig.update_layout(
+            map=dict(style=self.map_style, center=dict(lat=25.2867, lon=51.5333), zoom=10),
+            margin=dict(l=0, r=0, t=0, b=0),
+            paper_bgcolor=self.colors['background'],
+            font_color=self.colors['text'],
+            uirevision='zones'  # Keep the user's pan/zoom across year switches
+        )
+        return fig
+
+    def choropleth_patch(self, year, data=None):
+        """Partial figure update carrying only the per-zone count vector"""
+        z = self.zone_count_vector(year, data)
+        patch = Patch()
+        patch['data'][0]['z'] = z
+        patch['data'][0]['zmax'] = max([count for count in z if count] or [1])
+        return patch
+
+    def create_layout(self):
+        data = self.data
         
-        # Add custom font
-        app.index_string = '''
-        <!DOCTYPE html>
-        <html>
-            <head>
-                <title>Qatar Traffic Accidents Analysis</title>
-                <link href="https://api.fontshare.com/v2/css?f[]=space-grotesk@400,700&display=swap" rel="stylesheet">
-                {%metas%}
-                {%favicon%}
-                {%css%}
-            </head>
-            <body>
-                {%app_entry%}
-                <footer>
-                    {%config%}
-                    {%scripts%}
-                    {%renderer%}
-                </footer>
-            </body>
-        </html>
-        '''
+        # Calculate metrics before creating layout
+        metrics = self.calculate_metrics(data)
         
         # Create initial map
-        initial_map_path = self.create_map(self.current_year)
+        if self.map_mode == 'geojson':
+            map_view = dcc.Graph(
+                id='zone-choropleth',
+                figure=self.create_choropleth(data.current_year, data=data),
+                style={'width': '100%', 'height': '100%'}
+            )
+        else:
+            map_view = html.Iframe(
+                id='map-iframe',
+                srcDoc=self.map_html(data.current_year, data),
+                style={'width': '100%', 'height': '100%', 'border': 'none'}
+            )
         
-        app.layout = html.Div(style={
+        return html.Div(style={
             'backgroundColor': self.colors['background'], 
             'padding': '20px',
             'minHeight': '100vh',
@@ -240,8 +330,8 @@ class QatarAccidentsDashboard:
                         dcc.Dropdown(
                             id='year-selector',
                             options=[{'label': str(int(year)), 'value': year} 
-                                    for year in sorted(self.df['ACCIDENT_YEAR'].unique())],
-                            value=self.current_year,
+                                    for year in data.year_index.years],
+                            value=data.current_year,
                             style={
                                 'width': '200px',
                                 'backgroundColor': self.colors['background'],
@@ -256,11 +346,7 @@ class QatarAccidentsDashboard:
                         'borderRadius': '10px',
                         'overflow': 'hidden'
                     }, children=[
-                        html.Iframe(
-                            id='map-iframe',
-                            srcDoc=open(initial_map_path, 'r').read(),
-                            style={'width': '100%', 'height': '100%', 'border': 'none'}
-                        )
+                        map_view
                     ])
                 ]),
                 
@@ -301,11 +387,7 @@ class QatarAccidentsDashboard:
                            style={'color': self.colors['neon_pink']}),
                     dcc.Dropdown(
                         id='category-selector',
-                        options=[
-                            {'label': 'Nationality Group', 'value': 'NATIONALITY_GROUP_OF_ACCIDENT_'},
-                            {'label': 'Accident Nature', 'value': 'ACCIDENT_NATURE'},
-                            {'label': 'Accident Reason', 'value': 'ACCIDENT_REASON'}
-                        ],
+                        options=CATEGORY_OPTIONS,
                         value='NATIONALITY_GROUP_OF_ACCIDENT_',
                         style={
                             'width': '200px',
@@ -331,20 +413,66 @@ class QatarAccidentsDashboard:
                 ])
             ])
         ])
+
+    def create_dashboard(self, watch_interval=WATCH_INTERVAL, **dash_kwargs):
+        app = dash.Dash(__name__, **dash_kwargs)
+        
+        # Add custom font
+        app.index_string = '''
+        <!DOCTYPE html>
+        <html>
+            <head>
+                <title>Qatar Traffic Accidents Analysis</title>
+                <link href="https://api.fontshare.com/v2/css?f[]=space-grotesk@400,700&display=swap" rel="stylesheet">
+                {%metas%}
+                {%favicon%}
+                {%css%}
+            </head>
+            <body>
+                {%app_entry%}
+                <footer>
+                    {%config%}
+                    {%scripts%}
+                    {%renderer%}
+                </footer>
+            </body>
+        </html>
+        '''
+        
+        if self.map_mode == 'geojson':
+            map_output = Output('zone-choropleth', 'figure')
+        else:
+            map_output = Output('map-iframe', 'srcDoc')
+        
+        app.layout = self.create_layout
+        register_stats_route(app.server, [self.figures])
+        data_version = lambda: (os.path.abspath(self.accidents_file), self.data.version)
+        
+        # Rebuild the snapshot in the background whenever the accidents file changes
+        if watch_interval and self.watcher is None:
+            self.watcher = DataWatcher([self.accidents_file], self.reload_data, watch_interval).start()
         
         @app.callback(
-            [Output('map-iframe', 'srcDoc'),
+            [map_output,
              Output('zone-stats-content', 'children')],
             [Input('year-selector', 'value')]
         )
         def update_map_and_stats(selected_year):
+            # A cleared year dropdown keeps the current map and stats
+            if selected_year is None:
+                return dash.no_update, dash.no_update
+            
+            # One snapshot for the whole callback, even if a reload swaps it meanwhile
+            data = self.data
+            
             # Update map
-            map_path = self.create_map(selected_year)
-            map_html = open(map_path, 'r').read()
+            if self.map_mode == 'geojson':
+                map_update = self.choropleth_patch(selected_year, data)
+            else:
+                map_update = self.map_html(selected_year, data)
             
             # Update stats
-            year_data = self.df[self.df['ACCIDENT_YEAR'] == selected_year]
-            zone_counts = year_data['ZONE'].value_counts().sort_values(ascending=False)
+            zone_counts = self.year_zone_counts(selected_year, data).sort_values(ascending=False)
             
             stats_content = []
             for zone, count in zone_counts.items():
@@ -359,17 +487,19 @@ class QatarAccidentsDashboard:
                     html.Div(f'Accidents: {count}', style={'fontSize': '0.9em'})
                 ]))
             
-            return map_html, stats_content
+            return map_update, stats_content
 
         @app.callback(
             Output('severity-bar-chart', 'figure'),
             [Input('category-selector', 'value')]
         )
+        @self.figures.cached(data_version, inputs=lambda: [[option['value'] for option in CATEGORY_OPTIONS]])
         def update_severity_bar_chart(selected_category):
-            if selected_category not in self.df.columns or 'ACCIDENT_SEVERITY' not in self.df.columns:
+            data = self.data
+            if selected_category not in data.df.columns or 'ACCIDENT_SEVERITY' not in data.df.columns:
                 return go.Figure()  # Return an empty figure if columns are missing
             
-            severity_counts = self.df.groupby([selected_category, 'ACCIDENT_SEVERITY']).size().unstack().fillna(0)
+            severity_counts = data.cube.marginal([selected_category, 'ACCIDENT_SEVERITY']).unstack().fillna(0)
             fig = px.bar(severity_counts, barmode='stack', title='Accident Severity by ' + selected_category)
             fig.update_layout(
                 plot_bgcolor=self.colors['background'],
@@ -382,15 +512,16 @@ class QatarAccidentsDashboard:
             Output('age-scatter-plot', 'figure'),
             [Input('year-selector', 'value')]
         )
+        @self.figures.cached(data_version, inputs=lambda: [self.data.year_index.years])
         def update_age_scatter_plot(selected_year):
-            if 'BIRTH_YEAR_OF_ACCIDENT_PERPETR' not in self.df.columns:
+            data = self.data
+            if 'BIRTH_YEAR_OF_ACCIDENT_PERPETR' not in data.df.columns:
                 return go.Figure()  # Return an empty figure if column is missing
             
-            year_data = self.df[self.df['ACCIDENT_YEAR'] == selected_year]
-            year_data['AGE'] = year_data['BIRTH_YEAR_OF_ACCIDENT_PERPETR'].apply(lambda x: selected_year - x if pd.notnull(x) else None)
-            year_data = year_data[(year_data['AGE'] >= 0) & (year_data['AGE'] <= 90)]  # Filter age between 0 and 90
-            age_counts = year_data.groupby('AGE').size().reset_index(name='ACCIDENT_COUNT')
-            mean_age = year_data['AGE'].mean()
+            # The cube only keeps ages between 0 and 90
+            age_counts = data.cube.marginal(['AGE'], where={'ACCIDENT_YEAR': selected_year})
+            mean_age = (age_counts.index * age_counts).sum() / age_counts.sum() if len(age_counts) else float('nan')
+            age_counts = age_counts.reset_index(name='ACCIDENT_COUNT')
             
             fig = px.scatter(age_counts, x='AGE', y='ACCIDENT_COUNT', size='ACCIDENT_COUNT', title='Age vs Number of Accidents')
             fig.add_annotation(
@@ -411,30 +542,33 @@ class QatarAccidentsDashboard:
             )
             return fig
         
+        self.warm_up = WarmUp(self.warm_up_stages()).start()
+        register_ready_route(app.server, self.warm_up)
+        
         return app
     
     def run_dashboard(self, debug=True):
-        # Create assets folder for map
-        Path('assets').mkdir(exist_ok=True)
-        
         app = self.create_dashboard()
+        self.warm_up.wait()
         app.run_server(debug=debug)
 
-    def calculate_metrics(self):
+    def calculate_metrics(self, data=None):
+        cube = (data or self.data).cube
+        
         # Calculate annual average accidents from 2020 onwards
-        recent_data = self.df[self.df['ACCIDENT_YEAR'] >= 2020]
-        annual_avg = len(recent_data) / len(recent_data['ACCIDENT_YEAR'].unique())
+        year_counts = cube.marginal(['ACCIDENT_YEAR'])
+        recent_counts = year_counts[year_counts.index >= 2020]
+        annual_avg = recent_counts.sum() / len(recent_counts) if len(recent_counts) else 0
         
         # Calculate total deaths till 2024
-        total_deaths = self.df['DEATH_COUNT'].sum()
+        total_deaths = cube.marginal(measure='deaths')
         
         # Calculate pedestrian collision deaths
-        pedestrian_deaths = self.df[
-            self.df['ACCIDENT_NATURE'] == 'COLLISION WITH PEDESTRIANS'
-        ]['DEATH_COUNT'].sum()
+        pedestrian_deaths = cube.marginal(
+            where={'ACCIDENT_NATURE': 'COLLISION WITH PEDESTRIANS'}, measure='deaths')
         
         # Calculate total accidents
-        total_accidents = len(self.df)
+        total_accidents = cube.marginal()
         
         return {
             'annual_avg': round(annual_avg, 1),
@@ -0,0 +1,148 @@
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from schema import ACCIDENT_SCHEMA, compact_column
+
+CUBE_DIMENSIONS = [
+    'ACCIDENT_YEAR',
+    'ZONE',
+    'ACCIDENT_SEVERITY',
+    'ACCIDENT_NATURE',
+    'ACCIDENT_REASON',
+    'NATIONALITY_GROUP_OF_ACCIDENT_',
+    'HOUR',
+    'AGE',
+]
+MAX_AGE = 90
+
+
+def perpetrator_age(df):
+    """Age at the time of the accident, missing outside the 0-90 range the charts use"""
+    if 'BIRTH_YEAR_OF_ACCIDENT_PERPETR' not in df.columns or 'ACCIDENT_YEAR' not in df.columns:
+        return None
+    birth_year = pd.to_numeric(df['BIRTH_YEAR_OF_ACCIDENT_PERPETR'], errors='coerce')
+    age = df['ACCIDENT_YEAR'] - birth_year
+    return compact_column(age.where((age >= 0) & (age <= MAX_AGE)), ACCIDENT_SCHEMA['AGE'])
+
+
+def group_codes(codes, shape):
+    """Distinct rows of an (n, d) matrix of level codes, sorted, and the group of every row
+
+    Rows are packed into one int64 key when the cube's cells fit in it;
+    otherwise (many zones x ages x reasons...) the rows are compared as tuples.
+    """
+    if not len(codes):
+        return np.zeros((0, len(shape)), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if math.prod(shape) <= np.iinfo(np.int64).max:
+        keys, inverse = np.unique(np.ravel_multi_index(codes.T, shape), return_inverse=True)
+        return np.stack(np.unravel_index(keys, shape), axis=1), inverse.reshape(-1)
+    rows, inverse = np.unique(codes, axis=0, return_inverse=True)
+    return rows, inverse.reshape(-1)
+
+
+class AccidentCube:
+    """Sparse accident counts and death sums over the dashboard dimensions
+
+    Only non-empty cells are stored, as one row of level codes per cell, so
+    the cube stays small however many raw rows there are. Code 0 is the
+    missing level of each dimension. Marginals are memoized because the
+    callbacks only ever ask a handful of distinct questions.
+    """
+
+    def __init__(self, df, dimensions=CUBE_DIMENSIONS, max_cached=256):
+        age = df['AGE'] if 'AGE' in df.columns else perpetrator_age(df)
+        self.dimensions = [dim for dim in dimensions
+                           if dim in df.columns or (dim == 'AGE' and age is not None)]
+        self.levels = {}
+
+        codes = []
+        for dim in self.dimensions:
+            values = age if dim == 'AGE' else df[dim]
+            dim_codes, uniques = pd.factorize(values, sort=True)
+            self.levels[dim] = pd.Index(np.asarray(uniques), name=dim)
+            codes.append(dim_codes + 1)
+        self.shape = tuple(len(self.levels[dim]) + 1 for dim in self.dimensions)
+
+        if codes:
+            cells, inverse = group_codes(np.stack(codes, axis=1), self.shape)
+            self.cells = cells.astype(np.int32)
+        else:
+            inverse = np.zeros(len(df), dtype=np.int64)
+            self.cells = np.zeros((1 if len(df) else 0, 0), dtype=np.int32)
+
+        if 'DEATH_COUNT' in df.columns:
+            deaths = pd.to_numeric(df['DEATH_COUNT'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        else:
+            deaths = np.zeros(len(df))
+        self.counts = np.bincount(inverse, minlength=len(self.cells)).astype(np.int64)
+        self.deaths = np.bincount(inverse, weights=deaths, minlength=len(self.cells))
+
+        self.max_cached = max_cached
+        self._marginals = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.cells)
+
+    def _mask(self, where):
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dim, value in where.items():
+            position = self.levels[dim].get_indexer([value])[0]
+            if position < 0:
+                return None
+            mask &= self.cells[:, self.dimensions.index(dim)] == position + 1
+        return mask
+
+    def _compute(self, dims, where, measure):
+        weights = self.counts if measure == 'count' else self.deaths
+        mask = self._mask(where)
+
+        if not dims:
+            total = weights[mask].sum() if mask is not None else 0
+            return int(total) if measure == 'count' else float(total)
+
+        if mask is None:
+            sub = np.zeros((0, len(dims)), dtype=np.int32)
+            values = weights[:0]
+        else:
+            sub = self.cells[mask][:, [self.dimensions.index(dim) for dim in dims]]
+            values = weights[mask]
+            # Like groupby, leave out rows where a requested dimension is missing
+            present = (sub > 0).all(axis=1)
+            sub, values = sub[present], values[present]
+
+        shape = tuple(len(self.levels[dim]) + 1 for dim in dims)
+        keys, inverse = group_codes(sub, shape)
+        sums = np.bincount(inverse, weights=values, minlength=len(keys))
+        if measure == 'count':
+            sums = sums.astype(np.int64)
+
+        labels = [self.levels[dim][keys[:, i] - 1] for i, dim in enumerate(dims)]
+        if len(dims) == 1:
+            index = pd.Index(labels[0], name=dims[0])
+        else:
+            index = pd.MultiIndex.from_arrays(labels, names=list(dims))
+        return pd.Series(sums, index=index, name=measure)
+
+    def marginal(self, dims=(), where=None, measure='count'):
+        """Counts (or death sums with measure='deaths') grouped by dims, filtered by where
+
+        With no dims the grand total is returned as a scalar. Grouped results
+        are sorted by the dimension levels, like a pandas groupby.
+        """
+        where = where or {}
+        key = (tuple(dims), tuple(sorted(where.items())), measure)
+        with self._lock:
+            result = self._marginals.get(key)
+        if result is None:
+            result = self._compute(list(dims), where, measure)
+            with self._lock:
+                if len(self._marginals) >= self.max_cached:
+                    self._marginals.clear()
+                self._marginals[key] = result
+
+        # Hand out copies so callers can't alter the memoized result
+        return result.copy() if isinstance(result, pd.Series) else result
@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from accident_cube import AccidentCube, perpetrator_age
+from data_plane import PLANE_DIR, load_shared_frame
+from data_version import file_hash, file_version
+from schema import ACCIDENT_SCHEMA, apply_schema, read_dtypes
+from year_index import YearIndex
+
+try:
+    import pyarrow.feather as feather
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+SNAPSHOT_DIR = '.cache'
+
+# Bump whenever clean_accidents or the schema changes so stale snapshots get rebuilt
+SNAPSHOT_FORMAT = 4
+
+
+def normalize_zones(zones):
+    """Categorical zone ids: str(int(float(x))) for digit-like values, 'Unknown' otherwise"""
+    # Accident exports repeat a few hundred zone spellings millions of times,
+    # so clean the distinct values only and broadcast the result back by code
+    codes, uniques = pd.factorize(zones, use_na_sentinel=False)
+    raw = pd.Series(uniques, dtype=object).astype(str).str.strip()
+
+    digit_like = raw.str.replace('.', '', regex=False).str.isdigit().fillna(False).astype(bool)
+    numbers = pd.to_numeric(raw.where(digit_like), errors='coerce')
+    valid = numbers.notna()
+
+    labels = pd.Series('Unknown', index=raw.index, dtype=object)
+    labels[valid] = np.trunc(numbers[valid]).astype('int64').astype(str)
+
+    label_codes, categories = pd.factorize(labels)
+    return pd.Categorical.from_codes(label_codes[codes], categories=categories)
+
+
+def extract_hours(times):
+    """First run of digits in ACCIDENT_TIME as a float hour (NaN when there is none)"""
+    codes, uniques = pd.factorize(times)
+    hours = pd.Series(uniques).str.extract(r'(\d+)', expand=False).astype(float).to_numpy()
+    return np.where(codes >= 0, hours[codes], np.nan) if len(hours) else np.full(len(codes), np.nan)
+
+
+def clean_accidents(df):
+    """Normalize ZONE ids and derive the HOUR column from ACCIDENT_TIME"""
+    df['ZONE'] = normalize_zones(df['ZONE'])
+
+    # Convert time to hour
+    df['HOUR'] = extract_hours(df['ACCIDENT_TIME'])
+    return df
+
+
+def normalize_read_zones(zones):
+    """normalize_zones for a ZONE column read as category, keyed as if read_csv had inferred its type"""
+    # Without a dtype read_csv parses the column as numbers when every value is
+    # one, so '1e3' was zone 1000 there and would be 'Unknown' as a string
+    categories = pd.Series(zones.cat.categories, dtype=object)
+    numbers = pd.to_numeric(categories, errors='coerce')
+    values = numbers if numbers.notna().all() else categories
+
+    # Normalize the distinct spellings plus a trailing NaN, which code -1 then picks up
+    labels = normalize_zones(pd.concat([values, pd.Series([np.nan])], ignore_index=True))
+    return labels[zones.cat.codes.to_numpy()]
+
+
+def read_accidents_csv(accidents_file):
+    """Read and clean an accidents CSV straight into the compact schema dtypes"""
+    df = pd.read_csv(accidents_file, skipinitialspace=True, dtype=read_dtypes(ACCIDENT_SCHEMA))
+    df['ZONE'] = normalize_read_zones(df['ZONE'])
+    return apply_schema(clean_accidents(df), ACCIDENT_SCHEMA)
+
+
+def snapshot_paths(accidents_file, snapshot_dir=SNAPSHOT_DIR):
+    base = Path(snapshot_dir) / Path(accidents_file).name
+    return base.with_name(base.name + '.feather'), base.with_name(base.name + '.meta.json')
+
+
+def source_key(accidents_file, use_hash=False):
+    return file_hash(accidents_file) if use_hash else file_version(accidents_file)
+
+
+def snapshot_is_fresh(accidents_file, snapshot_dir=SNAPSHOT_DIR, use_hash=False):
+    data_path, meta_path = snapshot_paths(accidents_file, snapshot_dir)
+    if not data_path.exists() or not meta_path.exists():
+        return False
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (meta.get('format') == SNAPSHOT_FORMAT
+            and meta.get('source') == source_key(accidents_file, use_hash))
+
+
+def write_snapshot(df, accidents_file, snapshot_dir=SNAPSHOT_DIR, use_hash=False):
+    """Write the cleaned frame as an uncompressed Feather file next to a version sidecar"""
+    data_path, meta_path = snapshot_paths(accidents_file, snapshot_dir)
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write to temporary files first so readers never see a half-written snapshot
+    tmp_data = data_path.with_name(f'{data_path.name}.{os.getpid()}.tmp')
+    tmp_meta = meta_path.with_name(f'{meta_path.name}.{os.getpid()}.tmp')
+    df.reset_index(drop=True).to_feather(tmp_data, compression='uncompressed')
+    with open(tmp_meta, 'w') as f:
+        json.dump({'format': SNAPSHOT_FORMAT, 'source': source_key(accidents_file, use_hash),
+                   'rows': len(df)}, f)
+    os.replace(tmp_data, data_path)
+    os.replace(tmp_meta, meta_path)
+    return data_path
+
+
+def build_snapshot(accidents_file, snapshot_dir=SNAPSHOT_DIR, use_hash=False):
+    df = read_accidents_csv(accidents_file)
+    write_snapshot(df, accidents_file, snapshot_dir, use_hash)
+    return df
+
+
+def load_accidents(accidents_file, snapshot_dir=SNAPSHOT_DIR, use_hash=False):
+    """Load the cleaned accidents frame, memory-mapping the columnar snapshot when it is fresh"""
+    if not HAS_PYARROW:
+        return read_accidents_csv(accidents_file)
+
+    if snapshot_is_fresh(accidents_file, snapshot_dir, use_hash):
+        data_path, _ = snapshot_paths(accidents_file, snapshot_dir)
+        try:
+            return feather.read_table(data_path, memory_map=True).to_pandas()
+        except Exception as e:
+            print(f"Warning: Could not read accidents snapshot, rebuilding: {e}")
+
+    df = read_accidents_csv(accidents_file)
+    try:
+        write_snapshot(df, accidents_file, snapshot_dir, use_hash)
+    except OSError as e:
+        print(f"Warning: Could not write accidents snapshot: {e}")
+    return df
+
+
+def prepare_accidents(accidents_file, snapshot_dir=SNAPSHOT_DIR):
+    """The cleaned frame sorted by year and with the perpetrator AGE, as the dashboards use it"""
+    df = YearIndex(load_accidents(accidents_file, snapshot_dir), 'ACCIDENT_YEAR').frame
+    age = perpetrator_age(df)
+    if age is not None:
+        df['AGE'] = age
+    return df
+
+
+def accident_plane_source(accidents_file):
+    return f'v{SNAPSHOT_FORMAT}-{file_version(accidents_file)}'
+
+
+def load_shared_accidents(accidents_file, plane_dir=PLANE_DIR):
+    """Prepared accidents memory-mapped from the data plane, so every worker shares one copy"""
+    return load_shared_frame(Path(accidents_file).name, accident_plane_source(accidents_file),
+                             lambda: prepare_accidents(accidents_file), plane_dir)
+
+
+class AccidentData:
+    """One consistent snapshot of the accidents data: the shared frame, its year index and cube
+
+    Dashboards swap a whole snapshot in on reload, so a callback that
+    reads dashboard.data once sees the same version throughout.
+    """
+
+    def __init__(self, accidents_file, plane_dir=PLANE_DIR):
+        self.version = accident_plane_source(accidents_file)
+        # Year filters are zero-copy slices of the sorted frame
+        self.year_index = YearIndex(load_shared_accidents(accidents_file, plane_dir), 'ACCIDENT_YEAR')
+        self.df = self.year_index.frame
+        # Aggregate once so callbacks answer from marginals instead of rescanning rows
+        self.cube = AccidentCube(self.df)
+        self.current_year = self.df['ACCIDENT_YEAR'].max()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the cleaned columnar snapshot of an accidents CSV')
+    parser.add_argument('accidents_file', nargs='?', default='facc.csv')
+    parser.add_argument('--snapshot-dir', default=SNAPSHOT_DIR)
+    parser.add_argument('--hash', action='store_true', help='key the snapshot on file content instead of mtime')
+    args = parser.parse_args()
+
+    if not HAS_PYARROW:
+        raise SystemExit('pyarrow is required to build snapshots')
+    df = build_snapshot(args.accidents_file, args.snapshot_dir, args.hash)
+    print(f"Wrote snapshot of {len(df)} rows to {snapshot_paths(args.accidents_file, args.snapshot_dir)[0]}")
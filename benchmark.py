@@ -0,0 +1,240 @@
+import argparse
+import itertools
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import synthetic_data
+
+REPO_DIR = Path(__file__).resolve().parent
+APPS = ['acc', 'app', 'liz', 'viola']
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+
+
+def prepare_workdir(workdir, rows, seed=0):
+    """Write facc.csv, liz.csv and viola.json with the given row count, plus the static zone files"""
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    polygons_file = REPO_DIR / 'qatar_zones_polygons.json'
+    synthetic_data.write_accidents(workdir / 'facc.csv', rows, seed, polygons_file=polygons_file)
+    synthetic_data.write_licenses(workdir / 'liz.csv', rows, seed + 1, start='2020-01-01')
+    synthetic_data.write_violations(workdir / 'viola.json', rows, seed + 2)
+    for name in ['zone_names.json', 'qatar_zones_polygons.json']:
+        target = workdir / name
+        if not target.exists():
+            target.symlink_to(REPO_DIR / name)
+    return workdir
+
+
+# Worker side: build one app in this process and time its callbacks
+
+def build_app(name):
+    if name == 'acc':
+        import acc
+        return acc.QatarAccidentsDashboard().create_dashboard()
+    if name == 'app':
+        import app
+        return app.QatarAccidentsDashboard().create_dashboard()
+    if name == 'liz':
+        import liz
+        return liz.LicenseDashboard().create_dashboard()
+    if name == 'viola':
+        import viola
+        return viola.create_app()
+    raise ValueError(f'Unknown app: {name}')
+
+
+def layout_components(component):
+    """Every component in a layout tree that has an id"""
+    found = {}
+    stack = [component]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (list, tuple)):
+            stack.extend(node)
+            continue
+        if not hasattr(node, 'to_plotly_json'):
+            continue
+        if getattr(node, 'id', None) is not None:
+            found[node.id] = node
+        stack.append(getattr(node, 'children', None))
+    return found
+
+
+def input_values(component, prop):
+    """Candidate values for a callback input: dropdown options, else the initial value"""
+    options = getattr(component, 'options', None) if prop == 'value' else None
+    if options:
+        return [option['value'] if isinstance(option, dict) else option for option in options]
+    return [getattr(component, prop, None)]
+
+
+def callback_calls(app, repeat):
+    """Argument tuples for `repeat` calls of every callback, cycling through the input combinations"""
+    # Dashboards serve their layout from a function so reloaded data shows up
+    layout = app.layout() if callable(app.layout) else app.layout
+    components = layout_components(layout)
+    calls = {}
+    for callback_id, spec in app.callback_map.items():
+        arguments = spec['inputs'] + spec.get('state', [])
+        candidates = [input_values(components.get(i['id']), i['property']) for i in arguments]
+        combos = list(itertools.islice(itertools.product(*candidates), repeat))
+        calls[callback_id] = [combos[i % len(combos)] for i in range(repeat)]
+    return calls
+
+
+def response_size(result):
+    import plotly
+    return len(json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def timed(func, calls):
+    """Milliseconds and response bytes of each call"""
+    timings, sizes = [], []
+    for args in calls:
+        start = time.perf_counter()
+        response = func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+        sizes.append(response_size(response))
+    return timings, sizes
+
+
+def latency(timings):
+    return {
+        'first_ms': round(timings[0], 3),
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_worker(name, repeat):
+    started = time.perf_counter()
+    app = build_app(name)
+    result = {
+        'build_seconds': round(time.perf_counter() - started, 3),
+        'rss_after_build_mb': peak_rss_mb(),
+        'callbacks': {},
+    }
+
+    for callback_id, calls in callback_calls(app, repeat).items():
+        callback = app.callback_map[callback_id]['callback'].__wrapped__
+        # Chart callbacks sit behind the figure cache: cold times the drawing itself,
+        # warm the cached callback once every combination has been drawn
+        draw = getattr(callback, '__wrapped__', callback)
+        try:
+            cold, sizes = timed(draw, calls)
+            warm = None
+            if draw is not callback:
+                timed(callback, calls)
+                warm, _ = timed(callback, calls)
+        except Exception as e:
+            message = ' '.join(str(e).split())[:300]
+            result['callbacks'][callback_id] = {'error': f'{type(e).__name__}: {message}'}
+            continue
+
+        result['callbacks'][callback_id] = {
+            'calls': len(cold),
+            'cold': latency(cold),
+            'warm': latency(warm) if warm else None,
+            'mean_response_bytes': int(np.mean(sizes)),
+            'max_response_bytes': int(max(sizes)),
+        }
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def failed_callbacks(result):
+    return [callback_id for callback_id, stats in result.get('callbacks', {}).items() if 'error' in stats]
+
+
+# Driver side: one subprocess per (size, app) so RSS and module state are isolated
+
+def benchmark_app(name, workdir, repeat, timeout):
+    command = [sys.executable, str(Path(__file__).resolve()), '--worker', name, '--repeat', str(repeat)]
+    try:
+        completed = subprocess.run(command, cwd=workdir, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'error': f'timed out after {timeout}s'}
+    try:
+        # A worker whose callbacks failed still reports the ones that ran
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every Dash callback against synthetic data')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--apps', nargs='+', default=APPS, choices=APPS)
+    parser.add_argument('--repeat', type=int, default=20, help='calls per callback')
+    parser.add_argument('--timeout', type=int, default=3600, help='seconds per app and size')
+    parser.add_argument('--data-dir', help='keep generated data here instead of a temporary directory')
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--worker', choices=APPS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, str(REPO_DIR))
+        result = run_worker(args.worker, args.repeat)
+        print(json.dumps(result))
+        sys.exit(1 if failed_callbacks(result) else 0)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'repeat': args.repeat,
+        },
+        'results': [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(args.data_dir or tmp)
+        for rows in args.sizes:
+            workdir = base / f'rows_{rows}'
+            print(f'Generating {rows} rows in {workdir}...')
+            prepare_workdir(workdir, rows)
+            for name in args.apps:
+                print(f'  {name}...')
+                outcome = benchmark_app(name, workdir, args.repeat, args.timeout)
+                report['results'].append({'rows': rows, 'app': name, **outcome})
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {args.out}')
+
+    failures = [f"{result['app']} at {result['rows']} rows: {result.get('error') or ', '.join(failed_callbacks(result))}"
+                for result in report['results'] if 'error' in result or failed_callbacks(result)]
+    if failures:
+        sys.exit('Failed:\n  ' + '\n  '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
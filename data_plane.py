@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+PLANE_DIR = '.cache/plane'
+
+# Bump whenever the on-disk layout changes so stale planes get republished
+PLANE_FORMAT = 1
+
+
+def _load(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Empty arrays have no data to map
+        return np.load(path)
+
+
+@contextmanager
+def directory_lock(directory):
+    """Hold an exclusive lock on a directory across processes, through a LOCK file inside it
+
+    Without fcntl (Windows) writers are not serialized, and their cleanup
+    relies on sparing whatever the directory currently points at.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / 'LOCK', 'a') as f:
+        if HAS_FCNTL:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if HAS_FCNTL:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def plane_lock(name, plane_dir=PLANE_DIR):
+    """Lock one name of the plane, so only one worker publishes it"""
+    return directory_lock(Path(plane_dir) / name)
+
+
+def publish(name, arrays, source, layout=None, plane_dir=PLANE_DIR):
+    """Write arrays as one .npy file each into a new version directory, then point CURRENT at it
+
+    CURRENT is swapped last with os.replace, so attaching workers see
+    either the old version or the new one, never a half-written mix.
+    Publishing holds plane_lock and is skipped when another worker
+    published the same source while this one waited for it.
+    """
+    with plane_lock(name, plane_dir):
+        root = Path(plane_dir) / name
+        if attach(name, source, plane_dir) is not None:
+            return root / (root / 'CURRENT').read_text().strip()
+        return _write_version(root, arrays, source, layout)
+
+
+def _write_version(root, arrays, source, layout):
+    version = f'{source}.{os.getpid()}'
+    tmp_dir = root / f'.{version}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+    for key, values in arrays.items():
+        np.save(tmp_dir / f'{key}.npy', np.asarray(values), allow_pickle=False)
+    with open(tmp_dir / 'meta.json', 'w') as f:
+        json.dump({'format': PLANE_FORMAT, 'source': source, 'arrays': list(arrays), 'layout': layout}, f)
+    shutil.rmtree(root / version, ignore_errors=True)
+    os.replace(tmp_dir, root / version)
+
+    tmp = root / f'CURRENT.{os.getpid()}.tmp'
+    tmp.write_text(version)
+    os.replace(tmp, root / 'CURRENT')
+
+    # Older versions can go; workers that still map them keep their pages. CURRENT is
+    # read again so a version another publisher swapped in meanwhile is never removed
+    keep = {version, (root / 'CURRENT').read_text().strip()}
+    for old in root.iterdir():
+        if old.is_dir() and old.name not in keep and not old.name.startswith('.'):
+            shutil.rmtree(old, ignore_errors=True)
+    return root / version
+
+
+def current_version(name, plane_dir=PLANE_DIR):
+    """Source key of the published version, None when nothing is published"""
+    root = Path(plane_dir) / name
+    try:
+        with open(root / (root / 'CURRENT').read_text().strip() / 'meta.json', 'r') as f:
+            return json.load(f)['source']
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def attach(name, source=None, plane_dir=PLANE_DIR):
+    """(arrays, layout) memory-mapped from the published version; None when missing or stale"""
+    root = Path(plane_dir) / name
+    try:
+        version_dir = root / (root / 'CURRENT').read_text().strip()
+        with open(version_dir / 'meta.json', 'r') as f:
+            meta = json.load(f)
+        if meta['format'] != PLANE_FORMAT or (source is not None and meta['source'] != source):
+            return None
+        arrays = {key: _load(version_dir / f'{key}.npy') for key in meta['arrays']}
+    except (OSError, KeyError, ValueError):
+        return None
+    return arrays, meta['layout']
+
+
+def frame_arrays(df):
+    """Plain NumPy arrays for every column of df, plus the layout to rebuild it
+
+    Categoricals are stored as codes and categories, nullable integers as
+    values and mask, and any other non-NumPy column as a categorical.
+    """
+    arrays, layout = {}, []
+    for i, column in enumerate(df.columns):
+        values = df[column].array
+        if isinstance(df[column].dtype, np.dtype):
+            arrays[f'{i}_values'] = df[column].to_numpy()
+            layout.append({'name': column, 'kind': 'numpy'})
+            continue
+        if not isinstance(values, (pd.Categorical, pd.arrays.IntegerArray)):
+            values = pd.Categorical(df[column])
+        if isinstance(values, pd.Categorical):
+            arrays[f'{i}_codes'] = values.codes
+            categories = values.categories
+            arrays[f'{i}_categories'] = categories.to_numpy(dtype=None if categories.dtype.kind in 'biufM' else str)
+            layout.append({'name': column, 'kind': 'category', 'ordered': bool(values.ordered)})
+        else:
+            arrays[f'{i}_values'] = values._data
+            arrays[f'{i}_mask'] = values._mask
+            layout.append({'name': column, 'kind': 'masked'})
+    return arrays, layout
+
+
+def frame_from_arrays(arrays, layout):
+    """DataFrame whose columns wrap the (memory-mapped) arrays without copying them"""
+    columns = {}
+    for i, column in enumerate(layout):
+        if column['kind'] == 'category':
+            values = pd.Categorical.from_codes(arrays[f'{i}_codes'], categories=pd.Index(arrays[f'{i}_categories']),
+                                               ordered=column['ordered'], validate=False)
+        elif column['kind'] == 'masked':
+            values = pd.arrays.IntegerArray(arrays[f'{i}_values'], arrays[f'{i}_mask'])
+        else:
+            values = arrays[f'{i}_values']
+        columns[column['name']] = pd.Series(values, copy=False)
+    return pd.DataFrame(columns, copy=False)
+
+
+def load_shared_frame(name, source, build, plane_dir=PLANE_DIR):
+    """Frame mapped from the data plane, built with build() and published first when stale
+
+    Workers finding it stale build one at a time under plane_lock, so the
+    first one builds and the rest attach to what it published.
+    """
+    attached = attach(name, source, plane_dir)
+    if attached is not None:
+        return frame_from_arrays(*attached)
+
+    df = None
+    try:
+        with plane_lock(name, plane_dir):
+            attached = attach(name, source, plane_dir)
+            if attached is None:
+                df = build()
+                arrays, layout = frame_arrays(df)
+                _write_version(Path(plane_dir) / name, arrays, source, layout)
+                attached = attach(name, source, plane_dir)
+    except OSError as e:
+        print(f"Warning: Could not publish {name} to the data plane: {e}")
+    if attached is not None:
+        return frame_from_arrays(*attached)
+    return df if df is not None else build()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Publish the shared read-only data plane that dashboard workers map')
+    parser.add_argument('--accidents-file', default='facc.csv')
+    parser.add_argument('--license-file', default='liz.csv')
+    parser.add_argument('--plane-dir', default=PLANE_DIR)
+    args = parser.parse_args()
+
+    from accident_data import accident_plane_source, prepare_accidents
+    from license_series import load_license_series
+    name = Path(args.accidents_file).name
+    df = prepare_accidents(args.accidents_file)
+    arrays, layout = frame_arrays(df)
+    path = publish(name, arrays, accident_plane_source(args.accidents_file), layout, args.plane_dir)
+    print(f"Published {len(df)} accident rows to {path}")
+    load_license_series(args.license_file, plane_dir=args.plane_dir)
+    print(f"Published license series for {args.license_file}")
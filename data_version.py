@@ -0,0 +1,17 @@
+import hashlib
+import os
+
+
+def file_version(path):
+    """Cheap version key for a data file, based on its size and modification time"""
+    stat = os.stat(path)
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Content hash of a data file, for when mtimes cannot be trusted (e.g. after a copy)"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,70 @@
+import os
+import threading
+
+from data_version import file_hash, file_version
+
+WATCH_INTERVAL = 5.0
+
+
+class DataWatcher:
+    """Background thread that reloads a dashboard's data when its files change
+
+    Files are polled by version (size and mtime, or content hash). A change
+    is acted on once two polls agree, so a file still being written is not
+    read half-way. reload() runs on the watcher thread, off the request
+    path, and is expected to build a complete snapshot and swap it in with
+    a single assignment; if it fails the old snapshot keeps serving.
+    """
+
+    def __init__(self, paths, reload, interval=WATCH_INTERVAL, use_hash=False):
+        self.paths = list(paths)
+        self.reload = reload
+        self.interval = interval
+        self.use_hash = use_hash
+        self.seen = self.versions()
+        self.pending = None
+        self.reloads = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def versions(self):
+        versions = {}
+        for path in self.paths:
+            try:
+                versions[path] = file_hash(path) if self.use_hash else file_version(path)
+            except OSError:
+                versions[path] = None
+        return versions
+
+    def check(self):
+        """Poll once; returns True when the data was reloaded"""
+        current = self.versions()
+        if current == self.seen:
+            self.pending = None
+            return False
+        if current != self.pending:
+            # Changed since the last poll; wait for the next one to confirm it settled
+            self.pending = current
+            return False
+
+        self.seen, self.pending = current, None
+        try:
+            self.reload()
+        except Exception as e:
+            print(f"Warning: Could not reload {', '.join(map(os.path.basename, self.paths))}: {e}")
+            return False
+        self.reloads += 1
+        return True
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='data-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
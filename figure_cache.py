@@ -0,0 +1,71 @@
+import functools
+import itertools
+import json
+
+import plotly.graph_objects as go
+
+from shared_cache import MISSING, SharedCache
+
+# Entries warm() may draw, shared out between the registered callbacks
+FIGURE_CACHE_ENTRIES = 256
+
+
+class FigureCache(SharedCache):
+    """Serialized figure JSON per (callback, inputs, data version), shared by every dashboard and worker
+
+    Chart callbacks take one of a handful of years, categories or
+    violation types, so once a combination has been drawn for the loaded
+    data version any worker answers it from the stored JSON with no
+    pandas or Plotly work. Entries live in the SharedCache backend (see
+    create_backend), so N workers draw each figure once rather than N
+    times. A new data version simply misses and the old entries age out
+    of the backend's LRU.
+    """
+
+    def __init__(self, backend=None, namespace='figures', warm_entries=FIGURE_CACHE_ENTRIES):
+        super().__init__(backend, namespace)
+        self.warm_entries = warm_entries
+        self.callbacks = {}
+
+    def cached(self, version, inputs=None):
+        """Cache a figure callback while version() stays the same
+
+        Every dashboard using the backend shares its keys, so version()
+        should name the data file as well as its version. inputs() lists
+        the possible values of each argument, in order, for warm(). Results that are not figures (None, patches) pass through
+        uncached.
+        """
+        def decorator(func):
+            name = f'{func.__module__}.{func.__qualname__}'
+
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = self.key(name, args, {}, version())
+                value = self.lookup(key)
+                if value is MISSING:
+                    figure = func(*args)
+                    if not isinstance(figure, go.Figure):
+                        return figure
+                    value = figure.to_json()
+                    self.store(key, value)
+                # Dash serializes a plain dict without revalidating it as a Figure
+                return json.loads(value)
+
+            if inputs is not None:
+                self.callbacks[name] = (wrapper, inputs)
+            return wrapper
+        return decorator
+
+    def warm(self):
+        """Draw every combination for the current data version
+
+        Each callback gets an equal share of warm_entries, so one with many
+        inputs (e.g. every month) cannot evict the others while warming.
+        """
+        share = self.warm_entries // max(len(self.callbacks), 1)
+        drawn = 0
+        for wrapper, inputs in list(self.callbacks.values()):
+            for args in itertools.islice(itertools.product(*inputs()), share):
+                wrapper(*args)
+                drawn += 1
+        return drawn
@@ -1,19 +1,361 @@
-import pandas as pd
+import argparse
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-# Load the data
-data = pd.read_csv('License.csv')
+import pandas as pd
+
+from data_version import file_version
+from license_aggregates import (CACHE_DIR, LICENSE_COLUMNS, LicenseAggregates, load_license_aggregates,
+                                read_aggregates, write_aggregates)
+from license_summary import LicenseSummary, load_license_summary, read_summary, write_summary
+
+DATE_COLUMN = 'FIRST_ISSUEDATE'
+DATE_FORMAT = '%Y-%m-%d'
+CHUNK_ROWS = 250_000
+BLOCK_BYTES = 64 * 1024 * 1024
+FINGERPRINT_BYTES = 64 * 1024
+
+# Checkpoint fields a refresh needs before it can append instead of rebuilding
+CHECKPOINT_KEYS = {'offset': int, 'fingerprint': str, 'output_size': int}
+
+
+def read_header(path):
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def filter_chunk(chunk, start_date, end_date):
+    """Rows whose FIRST_ISSUEDATE parses and falls inside [start_date, end_date]"""
+    dates = pd.to_datetime(chunk[DATE_COLUMN], errors='coerce', format=DATE_FORMAT)
+    return chunk[(dates >= start_date) & (dates <= end_date)]
+
+
+def read_options(columns):
+    # Keep every value as the exact source text so liz.csv round-trips unchanged
+    return dict(usecols=columns, dtype=str, keep_default_na=False)
+
+
+def iter_chunks(path, columns, chunksize):
+    return pd.read_csv(path, chunksize=chunksize, **read_options(columns))
+
+
+def header_end(path):
+    with open(path, 'rb') as f:
+        f.readline()
+        return f.tell()
+
+
+def complete_lines_end(path):
+    """Offset just past the last newline, so a row still being written is left for next time"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            step = min(FINGERPRINT_BYTES, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b'\n')
+            if newline >= 0:
+                return position - step + newline + 1
+            position -= step
+    return 0
+
+
+def byte_ranges(path, block_bytes=BLOCK_BYTES, start=None, stop=None):
+    """Split the rows after the header (or between start and stop) into line-aligned byte ranges
+
+    Assumes no quoted field spans several lines, which holds for the
+    license exports.
+    """
+    size = os.path.getsize(path) if stop is None else stop
+    ranges = []
+    with open(path, 'rb') as f:
+        if start is None:
+            f.readline()
+            start = f.tell()
+        while start < size:
+            f.seek(min(start + block_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_range(path, start, end, names, **options):
+    """Parse the rows in one byte range of a CSV whose header is names"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(data), header=None, names=names, **options)
+
+
+def filter_range(path, start, end, names, columns, start_date, end_date):
+    chunk = read_range(path, start, end, names, **read_options(columns))
+    return filter_chunk(chunk, start_date, end_date)
+
+
+def select_columns(path, names, columns):
+    """Requested columns plus FIRST_ISSUEDATE, in file order (None keeps them all)"""
+    if not columns:
+        return None
+    columns = list(dict.fromkeys([*columns, DATE_COLUMN]))
+    missing = [col for col in columns if col not in names]
+    if missing:
+        raise ValueError(f'Columns not in {path}: {missing}')
+    return [col for col in names if col in columns]
+
+
+def iter_filtered(path, start_date, end_date, columns=None, chunksize=CHUNK_ROWS, workers=1,
+                  block_bytes=BLOCK_BYTES):
+    """Yield filtered chunks in file order, optionally parsing blocks on a process pool"""
+    names = read_header(path)
+    columns = select_columns(path, names, columns)
+
+    if workers <= 1:
+        for chunk in iter_chunks(path, columns, chunksize):
+            yield filter_chunk(chunk, start_date, end_date)
+        return
+
+    # Keep only a couple of blocks per worker in flight so memory stays bounded
+    ranges = byte_ranges(path, block_bytes)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for start, end in ranges:
+            pending.append(pool.submit(filter_range, path, start, end, names, columns, start_date, end_date))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+class CsvSink:
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._header_written = False
+
+    def write(self, chunk):
+        chunk.to_csv(self.path, mode='a' if self._header_written else 'w',
+                     header=not self._header_written, index=False)
+        self._header_written = True
+        self.rows += len(chunk)
+
+    def close(self):
+        if not self._header_written:
+            open(self.path, 'w').close()
+
+
+class ParquetSink:
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._pq = pq
+        self.path = path
+        self.rows = 0
+        self._writer = None
+
+    def write(self, chunk):
+        table = self._pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def stream_filter(source, output, start_date, end_date, columns=None, chunksize=CHUNK_ROWS,
+                  workers=1, output_format=None):
+    """Filter source into output chunk by chunk and return the number of rows kept"""
+    output_format = output_format or ('parquet' if str(output).endswith('.parquet') else 'csv')
+    tmp_output = f'{output}.{os.getpid()}.tmp'
+    sink = ParquetSink(tmp_output) if output_format == 'parquet' else CsvSink(tmp_output)
+
+    try:
+        for chunk in iter_filtered(source, start_date, end_date, columns, chunksize, workers):
+            if len(chunk) or sink.rows == 0:
+                sink.write(chunk)
+        sink.close()
+    except BaseException:
+        sink.close()
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        raise
+
+    # Readers of the output never see a half-written file
+    os.replace(tmp_output, output)
+    return sink.rows
+
+
+def checkpoint_path(output):
+    return f'{output}.checkpoint.json'
+
+
+def read_checkpoint(output):
+    try:
+        with open(checkpoint_path(output), 'r') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return checkpoint if isinstance(checkpoint, dict) else None
+
+
+def write_checkpoint(output, checkpoint):
+    tmp_path = f'{checkpoint_path(output)}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, checkpoint_path(output))
+
+
+def source_fingerprint(path, offset):
+    """Hash of the bytes just before offset, to notice a source that was rewritten rather than appended to"""
+    with open(path, 'rb') as f:
+        f.seek(max(0, offset - FINGERPRINT_BYTES))
+        return hashlib.sha1(f.read(min(offset, FINGERPRINT_BYTES))).hexdigest()
+
+
+def can_resume(checkpoint, settings, source, output, stop):
+    if not checkpoint or any(checkpoint.get(key) != value for key, value in settings.items()):
+        return False
+    # A checkpoint cut short or edited by hand is treated as missing
+    if not all(isinstance(checkpoint.get(key), kind) for key, kind in CHECKPOINT_KEYS.items()):
+        return False
+    # Older checkpoints did not record the output version the derived files were built from
+    if checkpoint.get('output_version') is None:
+        return False
+    if not os.path.exists(output) or os.path.getsize(output) < checkpoint['output_size']:
+        return False
+    return (checkpoint['offset'] <= stop
+            and source_fingerprint(source, checkpoint['offset']) == checkpoint['fingerprint'])
+
+
+def refresh(source, output, start_date, end_date, columns=None, block_bytes=BLOCK_BYTES, cache_dir=CACHE_DIR):
+    """Append the source rows added since the last refresh to output and fold them into its aggregates and summary
+
+    Licenses are only ever appended to License.csv, so the checkpoint
+    next to the output records how many source bytes have been
+    materialized. Anything else (a rewritten source, different
+    options, a missing checkpoint) falls back to a full rebuild.
+    Returns the number of rows appended.
+    """
+    names = read_header(source)
+    columns = select_columns(source, names, columns)
+    settings = {
+        'source': os.path.abspath(source),
+        'header': names,
+        'columns': columns,
+        'start': start_date.strftime(DATE_FORMAT),
+        'end': end_date.strftime(DATE_FORMAT),
+    }
+    stop = complete_lines_end(source)
+    checkpoint = read_checkpoint(output)
+    tracks_licenses = all(col in (columns or names) for col in LICENSE_COLUMNS)
+
+    if can_resume(checkpoint, settings, source, output, stop):
+        # Drop whatever an interrupted refresh appended after its checkpoint
+        if os.path.getsize(output) > checkpoint['output_size']:
+            with open(output, 'r+b') as f:
+                f.truncate(checkpoint['output_size'])
+        target = output
+        offset = checkpoint['offset']
+        max_issue_date = checkpoint['max_issue_date']
+        # Derived files are checked against the output version the checkpoint saw,
+        # which still holds after rolling back an interrupted append
+        output_version = checkpoint.get('output_version')
+        aggregates = read_aggregates(output, cache_dir, output_version) if tracks_licenses else None
+        summary = read_summary(output, cache_dir, output_version)
+        summary = LicenseSummary.from_dict(summary) if summary is not None else None
+    else:
+        print(f"No usable checkpoint for {output}, rebuilding it from {source}")
+        target = f'{output}.{os.getpid()}.tmp'
+        pd.DataFrame(columns=columns or names).to_csv(target, index=False)
+        offset = header_end(source)
+        max_issue_date = None
+        aggregates = LicenseAggregates() if tracks_licenses else None
+        summary = LicenseSummary()
+
+    rows = late = 0
+    try:
+        for start, end in byte_ranges(source, block_bytes, offset, stop):
+            chunk = filter_range(source, start, end, names, columns, start_date, end_date)
+            if not len(chunk):
+                continue
+            chunk.to_csv(target, mode='a', header=False, index=False)
+            rows += len(chunk)
+
+            # ISO dates compare correctly as text
+            dates = chunk[DATE_COLUMN]
+            if max_issue_date is not None:
+                late += int((dates < max_issue_date).sum())
+            max_issue_date = max(dates.max(), max_issue_date or '')
+            # Count empty fields as missing, the way a plain read of the output would
+            parsed = chunk.replace('', float('nan'))
+            if aggregates is not None:
+                aggregates.update(parsed)
+            if summary is not None:
+                summary.update(parsed)
+    except BaseException:
+        if target != output and os.path.exists(target):
+            os.remove(target)
+        raise
+
+    if target != output:
+        os.replace(target, output)
+    if late:
+        print(f"Warning: {late} new licenses were issued before the latest already in {output}")
+
+    if aggregates is not None:
+        write_aggregates(aggregates, output, cache_dir)
+    elif tracks_licenses:
+        load_license_aggregates(output, cache_dir)
+    if summary is not None:
+        write_summary(summary, output, cache_dir)
+    else:
+        load_license_summary(output, cache_dir)
+
+    # Written last: a crash before this point just repeats the refresh
+    write_checkpoint(output, {
+        **settings,
+        'offset': stop,
+        'fingerprint': source_fingerprint(source, stop),
+        'output_size': os.path.getsize(output),
+        'output_version': file_version(output),
+        'max_issue_date': max_issue_date,
+    })
+    return rows
 
-# Convert the FIRST_ISSUEDATE column to datetime, coerce errors
-data['FIRST_ISSUEDATE'] = pd.to_datetime(data['FIRST_ISSUEDATE'], errors='coerce', format='%Y-%m-%d')
 
-# Define the date range
-start_date = datetime(2020, 1, 1)
-end_date = datetime(2024, 12, 31)
+def parse_date(value):
+    return datetime.strptime(value, DATE_FORMAT)
 
-# Filter the data
-filtered_data = data[(data['FIRST_ISSUEDATE'] >= start_date) & (data['FIRST_ISSUEDATE'] <= end_date)]
 
-# Output the filtered data
-filtered_data.to_csv('liz.csv', index=False)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keep licenses first issued within a date range')
+    parser.add_argument('source', nargs='?', default='License.csv')
+    parser.add_argument('output', nargs='?', default='liz.csv', help='.csv or .parquet')
+    parser.add_argument('--start', type=parse_date, default=datetime(2020, 1, 1))
+    parser.add_argument('--end', type=parse_date, default=datetime(2024, 12, 31))
+    parser.add_argument('--columns', nargs='+', help='only keep these columns')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=1, help='parse blocks on this many processes')
+    parser.add_argument('--format', choices=['csv', 'parquet'], dest='output_format')
+    parser.add_argument('--incremental', action='store_true',
+                        help='append only rows added to the source since the last incremental run (CSV output)')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='where the license aggregates are kept')
+    args = parser.parse_args()
 
+    if args.incremental:
+        if args.output_format == 'parquet' or args.output.endswith('.parquet'):
+            parser.error('--incremental only supports CSV output')
+        rows = refresh(args.source, args.output, args.start, args.end, args.columns, cache_dir=args.cache_dir)
+        print(f"Appended {rows} rows to {args.output}")
+    else:
+        rows = stream_filter(args.source, args.output, args.start, args.end, args.columns,
+                             args.chunksize, args.workers, args.output_format)
+        print(f"Wrote {rows} rows to {args.output}")
@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from data_plane import directory_lock
+from fingerprint_similarity import BLOCK_ROWS, FingerprintIndex, l2_normalize
+
+ARRAYS = ['centroids', 'offsets', 'vectors', 'ids', 'positions']
+N_PROBE = 16
+# Below this many fingerprints an exact scan is already fast enough
+ANN_MIN_ROWS = 50_000
+
+
+def default_lists(n):
+    return max(1, min(n, int(4 * np.sqrt(n))))
+
+
+def assign_lists(vectors, centroids, block_rows=BLOCK_ROWS):
+    """Index of the most similar centroid for every row"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows])
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors, n_lists, n_iter=10, sample_size=100_000, seed=0):
+    """Unit-length centroids fitted on a sample of the (already normalized) rows"""
+    rng = np.random.default_rng(seed)
+    sample = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), sample_size), replace=False))]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = assign_lists(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        # Lists that lost every point restart from a random sample row
+        empty = np.bincount(assignments, minlength=n_lists) == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = l2_normalize(sums, vectors.dtype)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index for approximate cosine top-k over millions of fingerprints
+
+    Rows are grouped by their nearest of n_lists k-means centroids and
+    stored list by list, so a query scores the centroids, then scans the
+    contiguous rows of its n_probe best lists only. The arrays can be
+    memory-mapped from disk, so every worker shares one copy.
+    """
+
+    def __init__(self, centroids, offsets, vectors, ids, positions, n_probe=N_PROBE):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.vectors = vectors
+        self.ids = ids
+        self.positions = positions
+        self.n_probe = n_probe
+
+    @classmethod
+    def build(cls, fingerprints, n_lists=None, n_iter=10, seed=0, n_probe=N_PROBE):
+        vectors = l2_normalize(fingerprints)
+        n_lists = n_lists or default_lists(len(vectors))
+        centroids = spherical_kmeans(vectors, n_lists, n_iter, seed=seed)
+        assignments = assign_lists(vectors, centroids)
+        ids = np.argsort(assignments, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=n_lists))))
+        positions = np.empty_like(ids)
+        positions[ids] = np.arange(len(ids))
+        return cls(centroids, offsets, vectors[ids], ids, positions, n_probe)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query_vectors(self, queries):
+        """Row ids or raw fingerprints (1-D or 2-D) as normalized query rows"""
+        queries = np.asarray(queries)
+        if queries.ndim == 0 or (queries.ndim == 1 and np.issubdtype(queries.dtype, np.integer)):
+            return np.asarray(self.vectors[self.positions[np.atleast_1d(queries)]])
+        return l2_normalize(np.atleast_2d(queries), self.vectors.dtype)
+
+    def probed_lists(self, query, n_probe):
+        return np.sort(np.argsort(-(self.centroids @ query))[:n_probe])
+
+    def candidates(self, query, n_probe):
+        return np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1])
+                               for i in self.probed_lists(query, n_probe)])
+
+    def reachable(self, query):
+        """How many matches ranked() can return for one query: the rows of its probed lists"""
+        lists = self.probed_lists(self.query_vectors(query)[0], min(self.n_probe, len(self.centroids)))
+        return int((self.offsets[lists + 1] - self.offsets[lists]).sum())
+
+    def top_k(self, queries, k=10, exclude_self=False, n_probe=None):
+        """(scores, ids), each (queries x k), best match first; short rows are padded with -1"""
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        query_rows = np.atleast_1d(np.asarray(queries))
+        q = self.query_vectors(queries)
+        skip_self = exclude_self and np.issubdtype(query_rows.dtype, np.integer)
+
+        scores_out = np.full((len(q), k), -np.inf, dtype=self.vectors.dtype)
+        ids_out = np.full((len(q), k), -1, dtype=np.int64)
+        for i, query in enumerate(q):
+            rows = self.candidates(query, n_probe)
+            if not len(rows):
+                continue
+            scores = np.asarray(self.vectors[rows]) @ query
+            ids = np.asarray(self.ids[rows])
+            if skip_self:
+                scores = np.where(ids == query_rows[i], -np.inf, scores)
+            take = min(k, len(rows))
+            best = np.argpartition(-scores, take - 1)[:take] if take < len(rows) else np.arange(len(rows))
+            best = best[np.lexsort((ids[best], -scores[best]))][:take]
+            scores_out[i, :len(best)] = scores[best]
+            ids_out[i, :len(best)] = ids[best]
+        return scores_out, ids_out
+
+    def ranked(self, query, limit):
+        """Ids and scores of the best `limit` matches among the probed lists, best first
+
+        There is no unlimited form: ranking every row would be the exact
+        scan this index exists to avoid.
+        """
+        scores, ids = self.top_k(query, limit)
+        keep = ids[0] >= 0
+        return ids[0][keep], scores[0][keep]
+
+
+def write_ivf_index(index, out_dir, source):
+    """Write the arrays as <name>.<source>.npy plus a meta.json swapped in last, holding the directory's lock"""
+    with directory_lock(out_dir):
+        _write_ivf_index(index, Path(out_dir), source)
+
+
+def _write_ivf_index(index, out_dir, source):
+    files = {}
+    for name in ARRAYS:
+        files[name] = f'{name}.{source}.npy'
+        tmp = out_dir / f'{files[name]}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, np.asarray(getattr(index, name)))
+        os.replace(tmp, out_dir / files[name])
+
+    meta = {'source': source, 'files': files, 'rows': len(index), 'lists': len(index.centroids),
+            'n_probe': index.n_probe}
+    tmp = out_dir / f'meta.json.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, out_dir / 'meta.json')
+
+    # Old arrays can go; processes that still map them keep their pages. meta.json is
+    # read again so arrays another writer swapped in meanwhile are never removed
+    keep = set(files.values())
+    try:
+        with open(out_dir / 'meta.json', 'r') as f:
+            keep.update(json.load(f)['files'].values())
+    except (OSError, KeyError, ValueError):
+        return
+    for old in out_dir.glob('*.npy'):
+        if old.name not in keep:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+def open_ivf_index(out_dir, source=None):
+    """Memory-map an index; returns None when it is missing or built from another source"""
+    out_dir = Path(out_dir)
+    try:
+        with open(out_dir / 'meta.json', 'r') as f:
+            meta = json.load(f)
+        if source is not None and meta['source'] != source:
+            return None
+        arrays = {name: np.load(out_dir / meta['files'][name], mmap_mode='r') for name in ARRAYS}
+    except (OSError, KeyError, ValueError):
+        return None
+    # The centroids are scanned on every query, so keep them in memory
+    arrays['centroids'] = np.array(arrays['centroids'])
+    return IVFIndex(n_probe=meta.get('n_probe', N_PROBE), **arrays)
+
+
+def load_similarity_index(fingerprints, out_dir, source, min_rows=ANN_MIN_ROWS):
+    """Exact index for small inputs, else the persisted IVF index, rebuilt when source changes"""
+    if len(fingerprints) < min_rows:
+        return FingerprintIndex(fingerprints)
+
+    index = open_ivf_index(out_dir, source)
+    if index is not None:
+        return index
+    built = None
+    try:
+        # Workers finding it stale build one at a time; the rest open what the first wrote
+        with directory_lock(out_dir):
+            index = open_ivf_index(out_dir, source)
+            if index is None:
+                built = IVFIndex.build(fingerprints)
+                _write_ivf_index(built, Path(out_dir), source)
+                index = open_ivf_index(out_dir, source)
+    except OSError as e:
+        print(f"Warning: Could not write fingerprint index: {e}")
+    return index or built or IVFIndex.build(fingerprints)
+
+
+def recall_benchmark(index, fingerprints, k=10, n_queries=200, n_probes=(1, 2, 4, 8, 16, 32), seed=0,
+                     tolerance=1e-6):
+    """Recall@k and latency of the IVF index against exact search, per n_probe
+
+    A returned row counts as found when its exact score is within
+    tolerance of the exact k-th best, so float32 near-ties between
+    duplicate fingerprints are not scored as misses.
+    """
+    exact = FingerprintIndex(fingerprints)
+    queries = np.random.default_rng(seed).choice(len(exact), min(n_queries, len(exact)), replace=False)
+    started = time.perf_counter()
+    truth_scores, _ = exact.top_k(queries, k)
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    kth = truth_scores[:, -1:]
+
+    results = []
+    for n_probe in n_probes:
+        started = time.perf_counter()
+        _, found = index.top_k(queries, k, n_probe=n_probe)
+        elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        found_scores = np.einsum('qkd,qd->qk', exact.vectors[np.maximum(found, 0)], exact.vectors[queries])
+        hits = ((found >= 0) & (found_scores >= kth - tolerance)).sum()
+        results.append({'n_probe': n_probe, 'recall': round(float(hits / truth_scores.size), 4),
+                        'ms_per_query': round(elapsed_ms, 3)})
+    return {'rows': len(exact), 'lists': len(index.centroids), 'k': k,
+            'exact_ms_per_query': round(exact_ms, 3), 'results': results}
+
+
+def synthetic_fingerprints(rows, zones=100, seed=0):
+    """Fingerprints of per-zone, per-day violation counts, whose small counts make them far more varied than monthly ones"""
+    import synthetic_data
+    rng = np.random.default_rng(seed)
+    daily = np.array(synthetic_data.VIOLATION_BASE_RATES, dtype=float) / 30
+    # Each zone leans towards its own mix of violation types
+    zone_mix = rng.dirichlet(np.ones(len(daily)), zones) * len(daily)
+    zone_size = rng.pareto(1.5, zones) + 0.2
+    zone = rng.integers(0, zones, rows)
+    rates = daily * zone_mix[zone] * (zone_size[zone] / zone_size.sum())[:, None]
+    counts = rng.poisson(rates).astype(np.float32)
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build an IVF fingerprint index and measure its recall')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='synthetic fingerprints to index')
+    parser.add_argument('--lists', type=int, help='inverted lists (default 4 * sqrt(rows))')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--out-dir', help='also persist the index here and benchmark the memory-mapped copy')
+    args = parser.parse_args()
+
+    fingerprints = synthetic_fingerprints(args.rows)
+    started = time.perf_counter()
+    index = IVFIndex.build(fingerprints, args.lists)
+    print(f"Built {len(index.centroids)} lists over {len(index)} fingerprints in {time.perf_counter() - started:.1f}s")
+    if args.out_dir:
+        write_ivf_index(index, args.out_dir, f'synthetic-{args.rows}')
+        index = open_ivf_index(args.out_dir)
+    print(json.dumps(recall_benchmark(index, fingerprints, args.k, args.queries), indent=2))
@@ -0,0 +1,86 @@
+import numpy as np
+
+BLOCK_ROWS = 65_536
+
+
+def l2_normalize(vectors, dtype=np.float32):
+    """Rows scaled to unit length; all-zero rows stay zero, as in sklearn's cosine_similarity"""
+    vectors = np.asarray(vectors, dtype=dtype)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _top_sorted(scores, indices, k):
+    """The k best (score, index) pairs per row, best first"""
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, keep, axis=1)
+        indices = np.take_along_axis(indices, keep, axis=1)
+    # Ties go to the earlier row so results do not depend on the block size
+    order = np.lexsort((indices, -scores), axis=1)
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+class FingerprintIndex:
+    """Exact cosine top-k over violation fingerprints without an N x N matrix
+
+    Fingerprints are L2-normalized once, so cosine similarity is a dot
+    product. Queries scan the rows in blocks, keep each block's best k
+    with argpartition and merge, so memory stays at block_rows x queries
+    however many fingerprints there are.
+    """
+
+    def __init__(self, fingerprints, block_rows=BLOCK_ROWS, dtype=np.float32):
+        self.vectors = l2_normalize(fingerprints, dtype)
+        self.block_rows = block_rows
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def query_vectors(self, queries):
+        """Row positions or raw fingerprints (1-D or 2-D) as normalized query rows"""
+        queries = np.asarray(queries)
+        if queries.ndim == 0 or (queries.ndim == 1 and np.issubdtype(queries.dtype, np.integer)):
+            return self.vectors[np.atleast_1d(queries)]
+        return l2_normalize(np.atleast_2d(queries), self.vectors.dtype)
+
+    def reachable(self, query):
+        """How many matches ranked() can return for one query: every row"""
+        return len(self)
+
+    def similarities(self, query):
+        """Cosine similarity of one query to every fingerprint, a length-N vector"""
+        return self.vectors @ self.query_vectors(query)[0]
+
+    def top_k(self, queries, k=10, exclude_self=False):
+        """(scores, indices), each (queries x k), best match first
+
+        With exclude_self, integer queries never return their own row.
+        """
+        query_rows = np.atleast_1d(np.asarray(queries))
+        q = self.query_vectors(queries)
+        skip_self = exclude_self and np.issubdtype(query_rows.dtype, np.integer)
+        k = min(k, len(self) - (1 if skip_self else 0))
+        if k <= 0:
+            return np.zeros((len(q), 0), dtype=self.vectors.dtype), np.zeros((len(q), 0), dtype=np.int64)
+
+        best_scores = np.full((len(q), 0), -np.inf, dtype=self.vectors.dtype)
+        best_indices = np.zeros((len(q), 0), dtype=np.int64)
+        for start in range(0, len(self), self.block_rows):
+            block = self.vectors[start:start + self.block_rows]
+            scores = q @ block.T
+            indices = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            if skip_self:
+                own = (query_rows >= start) & (query_rows < start + len(block))
+                scores[own, query_rows[own] - start] = -np.inf
+
+            block_scores, block_indices = _top_sorted(scores, indices, k)
+            best_scores, best_indices = _top_sorted(np.concatenate([best_scores, block_scores], axis=1),
+                                                    np.concatenate([best_indices, block_indices], axis=1), k)
+        return best_scores, best_indices
+
+    def ranked(self, query, limit=None):
+        """Indices and scores of the best `limit` matches to one query (all rows by default), best first"""
+        scores, indices = self.top_k(query, len(self) if limit is None else limit)
+        return indices[0], scores[0]
@@ -1,8 +1,113 @@
+import functools
+import os
+import threading
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output
+from warm_up import WarmUp, register_ready_route
+
+
+def build_accidents(prefix):
+    from acc import QatarAccidentsDashboard
+    return QatarAccidentsDashboard().create_dashboard(requests_pathname_prefix=prefix)
+
+
+def build_license(prefix):
+    from liz import LicenseDashboard
+    return LicenseDashboard().create_dashboard(requests_pathname_prefix=prefix)
+
+
+def build_violations(prefix):
+    import viola
+    return viola.create_app(requests_pathname_prefix=prefix)
+
+
+# Route -> factory returning that section's Dash app; add an entry to plug in a page
+SECTIONS = {
+    '/accidents': build_accidents,
+    '/license': build_license,
+    '/violations': build_violations,
+}
+
+
+class LazySections:
+    """WSGI middleware serving each section's Dash app under its route, built on first visit
+
+    Nothing but the landing page is loaded at startup, and a section's
+    data is only paid for by the workers that serve it. Every worker
+    reads the same on-disk snapshots and aggregates, so a section loads
+    from derived files once any worker has built them.
+    """
+
+    def __init__(self, landing, sections):
+        self.landing = landing
+        self.sections = sections
+        self.apps = {}
+        self.locks = {prefix: threading.Lock() for prefix in sections}
+
+    def section(self, prefix):
+        app = self.apps.get(prefix)
+        if app is None:
+            # One build per section; other sections keep serving meanwhile
+            with self.locks[prefix]:
+                app = self.apps.get(prefix)
+                if app is None:
+                    app = self.apps[prefix] = self.sections[prefix](prefix + '/')
+        return app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        for prefix in self.sections:
+            if path == prefix or path.startswith(prefix + '/'):
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + prefix
+                environ['PATH_INFO'] = path[len(prefix):] or '/'
+                return self.section(prefix).server(environ, start_response)
+        return self.landing(environ, start_response)
+
+
+def warm_up_sections(spec=None):
+    """Routes named by a spec such as 'all' or 'accidents,license'
+
+    Defaults to the TRAFFIQ_WARMUP environment variable, then no section.
+    """
+    spec = os.environ.get('TRAFFIQ_WARMUP', '') if spec is None else spec
+    names = [name.strip().strip('/') for name in spec.split(',') if name.strip()]
+    if 'all' in names:
+        return list(SECTIONS)
+    for name in names:
+        if '/' + name not in SECTIONS:
+            raise ValueError(f'Unknown section: {name}')
+    return ['/' + name for name in names]
+
+
+def warm_section(sections, prefix):
+    """Build a section, then wait for its own warm-up stages"""
+    warm_up = sections.section(prefix).server.extensions.get('warm_up')
+    if warm_up is not None:
+        warm_up.wait()
+    return warm_up
+
+
+def create_server(spec=None):
+    """The home server, with the sections named by spec (see warm_up_sections) building in the background
+
+    Serve it with e.g. gunicorn 'home:create_server()'. Sections warmed
+    here are built in parallel at startup instead of on first visit, and
+    /ready answers 503 until they are, so traffic only reaches warm workers.
+    """
+    global warm_up
+    if warm_up is None:
+        warm_up = WarmUp({prefix[1:]: functools.partial(warm_section, sections, prefix)
+                          for prefix in warm_up_sections(spec)}).start()
+        register_ready_route(server, warm_up)
+    return server
+
 
 app = dash.Dash(__name__)
+server = app.server
+sections = LazySections(server.wsgi_app, SECTIONS)
+server.wsgi_app = sections
+warm_up = None
 
 app.layout = html.Div(style={
     'backgroundColor': '#111111',
@@ -61,7 +166,7 @@ app.layout = html.Div(style={
             html.I(className='fas fa-id-card'),
             'License'
         ]), href='/license'),
-        html.Button(style={
+        html.A(html.Button(style={
             'backgroundColor': '#222',
             'color': '#FFFFFF',
             'padding': '15px 30px',
@@ -74,7 +179,7 @@ app.layout = html.Div(style={
         }, children=[
             html.I(className='fas fa-exclamation-triangle'),
             'Violations'
-        ]),
+        ]), href='/violations'),
         html.Button(style={
             'backgroundColor': '#222',
             'color': '#FFFFFF',
@@ -107,4 +212,6 @@ app.layout = html.Div(style={
 ])
 
 if __name__ == '__main__':
+    create_server()
+    warm_up.wait()
     app.run_server(debug=True)
@@ -0,0 +1,156 @@
+import argparse
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from data_version import file_version
+from schema import LICENSE_SCHEMA, compact_column
+
+CACHE_DIR = '.cache'
+CATEGORIES = ['GENDER', 'NATIONALITY_GROUP']
+LICENSE_COLUMNS = ['FIRST_ISSUEDATE', 'BIRTHYEAR', *CATEGORIES]
+CHUNK_ROWS = 500_000
+
+# Bump whenever the aggregates change shape so stale files get rebuilt
+AGGREGATES_FORMAT = 3
+
+
+def derive_license_columns(df):
+    """Parse FIRST_ISSUEDATE and add the AGE, MONTH and YEAR columns the dashboard plots"""
+    df['FIRST_ISSUEDATE'] = pd.to_datetime(df['FIRST_ISSUEDATE'], errors='coerce')
+    # Nullable integers so a few unparseable dates don't turn every year into a float
+    year = df['FIRST_ISSUEDATE'].dt.year.astype('Int64')
+    df['AGE'] = year - pd.to_numeric(df['BIRTHYEAR'], errors='coerce').round().astype('Int64')
+    df['MONTH'] = df['FIRST_ISSUEDATE'].dt.month.astype('Int64')
+    df['YEAR'] = year
+    for column in ['AGE', 'MONTH', 'YEAR']:
+        df[column] = compact_column(df[column], LICENSE_SCHEMA[column])
+    return df
+
+
+def _add(left, right):
+    if left is None:
+        return right
+    return left.add(right, fill_value=0).astype('int64').sort_index()
+
+
+class LicenseAggregates:
+    """Additive license counts behind every chart on the license page
+
+    Weekly and monthly counts per category value and year, counts per age
+    and counts per (year, month) are plain sums, so rows appended to liz.csv can be
+    folded in without rereading the rows already counted.
+    """
+
+    def __init__(self, weekly=None, monthly_by_category=None, ages=None, monthly=None, max_issue_date=None):
+        self.weekly = weekly or {}
+        self.monthly_by_category = monthly_by_category or {}
+        self.ages = ages
+        self.monthly = monthly
+        self.max_issue_date = max_issue_date
+
+    def update(self, df):
+        """Fold raw liz.csv rows into the counts"""
+        df = derive_license_columns(df.copy())
+        for category in CATEGORIES:
+            if category not in df.columns:
+                continue
+            counts = df.groupby(['YEAR', category, pd.Grouper(key='FIRST_ISSUEDATE', freq='W')]).size()
+            self.weekly[category] = _add(self.weekly.get(category), counts)
+            counts = df.groupby(['YEAR', category, 'MONTH']).size()
+            self.monthly_by_category[category] = _add(self.monthly_by_category.get(category), counts)
+        self.ages = _add(self.ages, df.groupby('AGE').size())
+        self.monthly = _add(self.monthly, df.groupby(['YEAR', 'MONTH']).size())
+
+        latest = df['FIRST_ISSUEDATE'].max()
+        if pd.notna(latest) and (self.max_issue_date is None or latest > self.max_issue_date):
+            self.max_issue_date = latest
+        return self
+
+    @classmethod
+    def from_csv(cls, license_file, chunksize=CHUNK_ROWS):
+        aggregates = cls()
+        usecols = lambda column: column in LICENSE_COLUMNS
+        for chunk in pd.read_csv(license_file, skipinitialspace=True, usecols=usecols, chunksize=chunksize):
+            aggregates.update(chunk)
+        return aggregates
+
+    @property
+    def categories(self):
+        return list(self.weekly)
+
+    @property
+    def years(self):
+        if self.monthly is None:
+            return []
+        return sorted(int(year) for year in self.monthly.index.unique('YEAR'))
+
+    @property
+    def rows(self):
+        return int(self.monthly.sum()) if self.monthly is not None else 0
+
+    def age_counts(self):
+        return self.ages.rename('COUNT').reset_index()
+
+    def monthly_counts(self):
+        return self.monthly.rename('COUNT').reset_index()
+
+    def mean_age(self):
+        total = self.ages.sum()
+        if not total:
+            return float('nan')
+        return float((self.ages.index.to_numpy(dtype=float) * self.ages.to_numpy()).sum() / total)
+
+
+def aggregates_path(license_file, cache_dir=CACHE_DIR):
+    return Path(cache_dir) / f'{Path(license_file).name}.aggregates.pkl'
+
+
+def read_aggregates(license_file, cache_dir=CACHE_DIR, source_version=None):
+    """Stored aggregates when they were built from the current liz.csv (or source_version), else None"""
+    path = aggregates_path(license_file, cache_dir)
+    try:
+        stored = pd.read_pickle(path)
+    except (OSError, ValueError, EOFError, AttributeError, ImportError) as e:
+        if path.exists():
+            print(f"Warning: Could not read license aggregates, rebuilding: {e}")
+        return None
+    if stored.get('format') != AGGREGATES_FORMAT or stored.get('source') != (source_version or file_version(license_file)):
+        return None
+    return stored['aggregates']
+
+
+def write_aggregates(aggregates, license_file, cache_dir=CACHE_DIR):
+    path = aggregates_path(license_file, cache_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    pd.to_pickle({'format': AGGREGATES_FORMAT, 'source': file_version(license_file),
+                  'aggregates': aggregates}, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_license_aggregates(license_file, cache_dir=CACHE_DIR):
+    """Aggregates for liz.csv, rebuilt in one chunked pass when the stored ones are stale"""
+    aggregates = read_aggregates(license_file, cache_dir)
+    if aggregates is not None:
+        return aggregates
+
+    aggregates = LicenseAggregates.from_csv(license_file)
+    try:
+        write_aggregates(aggregates, license_file, cache_dir)
+    except OSError as e:
+        print(f"Warning: Could not write license aggregates: {e}")
+    return aggregates
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the license dashboard aggregates from liz.csv')
+    parser.add_argument('license_file', nargs='?', default='liz.csv')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+
+    aggregates = LicenseAggregates.from_csv(args.license_file)
+    path = write_aggregates(aggregates, args.license_file, args.cache_dir)
+    print(f"Wrote aggregates of {aggregates.rows} licenses to {path}")
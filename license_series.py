@@ -0,0 +1,164 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_plane import PLANE_DIR, attach, publish
+from data_version import file_version
+from license_aggregates import CACHE_DIR, load_license_aggregates
+
+# Bump whenever the stored arrays change layout so stale files get rebuilt
+SERIES_FORMAT = 1
+
+WEEK = np.timedelta64(7, 'D')
+
+
+def dense_weeks(frame, category, values):
+    """(values x weeks) counts on a weekly axis starting at the first week label in frame"""
+    start = frame['FIRST_ISSUEDATE'].min().to_datetime64().astype('datetime64[D]')
+    dates = frame['FIRST_ISSUEDATE'].to_numpy().astype('datetime64[D]')
+    positions = ((dates - start) // WEEK).astype(np.int64)
+    counts = np.zeros((len(values), positions.max() + 1), dtype=np.int32)
+    np.add.at(counts, (values.get_indexer(frame[category]), positions), frame['COUNT'].to_numpy())
+    return start, counts
+
+
+class LicenseSeries:
+    """Dense weekly and monthly license counts per category value, one block per year
+
+    Each category keeps int32 arrays shaped (years, values, weeks) and
+    (years, values, 12), plus one all-years weekly block, so a chart's
+    data is an array lookup whatever the size of liz.csv.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.categories = [str(category) for category in arrays['categories']]
+        self.values = {category: pd.Index(arrays[f'{category}__values'], name=category)
+                       for category in self.categories}
+        self.year_positions = {category: {int(year): i for i, year in enumerate(arrays[f'{category}__years'])}
+                               for category in self.categories}
+
+    @classmethod
+    def from_aggregates(cls, aggregates):
+        arrays = {'categories': np.array(aggregates.categories)}
+        for category in aggregates.categories:
+            weekly = aggregates.weekly[category].rename('COUNT').reset_index()
+            monthly = aggregates.monthly_by_category[category].rename('COUNT').reset_index()
+            values = pd.Index(sorted(weekly[category].astype(str).unique()))
+            weekly[category] = weekly[category].astype(str)
+            monthly[category] = monthly[category].astype(str)
+            years = sorted(int(year) for year in weekly['YEAR'].unique())
+
+            # Per-year blocks share one width: the longest year's week count
+            blocks = [dense_weeks(weekly[weekly['YEAR'] == year], category, values) for year in years]
+            width = max((counts.shape[1] for _, counts in blocks), default=0)
+            weeks = np.zeros((len(years), len(values), width), dtype=np.int32)
+            for i, (_, counts) in enumerate(blocks):
+                weeks[i, :, :counts.shape[1]] = counts
+
+            months = np.zeros((len(years), len(values), 12), dtype=np.int32)
+            year_codes = pd.Index(years).get_indexer(monthly['YEAR'].astype('int64'))
+            np.add.at(months, (year_codes, values.get_indexer(monthly[category]),
+                               monthly['MONTH'].astype('int64').to_numpy() - 1), monthly['COUNT'].to_numpy())
+
+            # Across years a week straddling New Year is one point, as in a plain groupby over all rows
+            overall = weekly.groupby([category, 'FIRST_ISSUEDATE'], as_index=False)['COUNT'].sum()
+            all_start, all_weeks = (dense_weeks(overall, category, values) if len(overall)
+                                    else (np.datetime64('NaT', 'D'), np.zeros((len(values), 0), dtype=np.int32)))
+
+            arrays.update({
+                f'{category}__values': np.array(values, dtype=str),
+                f'{category}__years': np.array(years, dtype=np.int64),
+                f'{category}__week_starts': np.array([start for start, _ in blocks], dtype='datetime64[D]'),
+                f'{category}__weekly': weeks,
+                f'{category}__monthly': months,
+                f'{category}__all_start': np.array(all_start, dtype='datetime64[D]'),
+                f'{category}__all_weekly': all_weeks,
+            })
+        return cls(arrays)
+
+    def years(self, category):
+        return sorted(self.year_positions.get(category, {}))
+
+    def _long(self, category, counts, labels, label_column):
+        value_codes, positions = np.nonzero(counts)
+        return pd.DataFrame({
+            category: self.values[category][value_codes],
+            label_column: labels[positions],
+            'COUNT': counts[value_codes, positions].astype(np.int64),
+        })
+
+    def weekly_counts(self, category, year=None):
+        """Weekly counts per category value for one year (all years when year is None)
+
+        Weeks are labelled by their closing Sunday and weeks without
+        licenses are left out, like groupby with pd.Grouper(freq='W').
+        """
+        if category not in self.values:
+            return pd.DataFrame(columns=[category, 'FIRST_ISSUEDATE', 'COUNT'])
+        if year is None:
+            start = self.arrays[f'{category}__all_start']
+            counts = self.arrays[f'{category}__all_weekly']
+        else:
+            position = self.year_positions[category].get(int(year))
+            if position is None:
+                return pd.DataFrame(columns=[category, 'FIRST_ISSUEDATE', 'COUNT'])
+            start = self.arrays[f'{category}__week_starts'][position]
+            counts = self.arrays[f'{category}__weekly'][position]
+        labels = pd.DatetimeIndex(start + WEEK * np.arange(counts.shape[1]))
+        return self._long(category, counts, labels, 'FIRST_ISSUEDATE')
+
+    def monthly_counts(self, category, year):
+        """Monthly counts per category value for one year"""
+        position = self.year_positions.get(category, {}).get(int(year))
+        if position is None:
+            return pd.DataFrame(columns=[category, 'MONTH', 'COUNT'])
+        counts = self.arrays[f'{category}__monthly'][position]
+        return self._long(category, counts, np.arange(1, 13), 'MONTH')
+
+
+def series_name(license_file):
+    return f'{Path(license_file).name}.series'
+
+
+def series_source(license_file):
+    return f'v{SERIES_FORMAT}-{file_version(license_file)}'
+
+
+def write_series(series, license_file, plane_dir=PLANE_DIR):
+    """Publish the arrays to the shared data plane"""
+    return publish(series_name(license_file), series.arrays, series_source(license_file), plane_dir=plane_dir)
+
+
+def read_series(license_file, plane_dir=PLANE_DIR):
+    """Series memory-mapped from the data plane; None when missing or built from another liz.csv"""
+    attached = attach(series_name(license_file), series_source(license_file), plane_dir)
+    return LicenseSeries(attached[0]) if attached is not None else None
+
+
+def load_license_series(license_file, cache_dir=CACHE_DIR, aggregates=None, plane_dir=PLANE_DIR):
+    """Series store for liz.csv, rebuilt from the license aggregates once per data version"""
+    series = read_series(license_file, plane_dir)
+    if series is not None:
+        return series
+
+    series = LicenseSeries.from_aggregates(aggregates or load_license_aggregates(license_file, cache_dir))
+    try:
+        write_series(series, license_file, plane_dir)
+    except OSError as e:
+        print(f"Warning: Could not write license series: {e}")
+    return read_series(license_file, plane_dir) or series
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Materialize weekly and monthly license series from liz.csv')
+    parser.add_argument('license_file', nargs='?', default='liz.csv')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--plane-dir', default=PLANE_DIR)
+    args = parser.parse_args()
+
+    series = LicenseSeries.from_aggregates(load_license_aggregates(args.license_file, args.cache_dir))
+    path = write_series(series, args.license_file, args.plane_dir)
+    print(f"Wrote license series for {', '.join(series.categories)} to {path}")
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from data_version import file_version
+
+CACHE_DIR = '.cache'
+SUMMARY_COLUMNS = ['GENDER', 'ORGAN_FLAG', 'NATIONALITY_GROUP']
+DATE_COLUMN = 'FIRST_ISSUEDATE'
+UNKNOWN_YEAR = 'unknown'
+CHUNK_ROWS = 500_000
+
+# Bump whenever the JSON layout changes so stale summaries get rebuilt
+SUMMARY_FORMAT = 1
+
+
+def issue_years(dates):
+    """Issue year of each row as a string, 'unknown' where the date does not parse"""
+    years = pd.to_datetime(dates, errors='coerce').dt.year
+    labels = pd.Series(UNKNOWN_YEAR, index=dates.index, dtype=object)
+    valid = years.notna()
+    labels[valid] = years[valid].astype('int64').astype(str)
+    return labels
+
+
+class LicenseSummary:
+    """Category counts over a license file, overall and per issue year
+
+    Only counts are kept, so chunks read one after another or summaries
+    built by separate workers combine with a plain merge.
+    """
+
+    def __init__(self, columns=SUMMARY_COLUMNS):
+        self.columns = list(columns)
+        self.year_rows = Counter()
+        self.counts = {column: {} for column in self.columns}
+
+    def update(self, df):
+        years = issue_years(df[DATE_COLUMN])
+        self.year_rows.update({year: int(n) for year, n in years.value_counts().items()})
+        for column in self.columns:
+            if column not in df.columns:
+                continue
+            by_year = self.counts[column]
+            for (year, value), n in df.groupby([years, df[column]]).size().items():
+                by_year.setdefault(year, Counter())[str(value).strip()] += int(n)
+        return self
+
+    def merge(self, other):
+        self.year_rows.update(other.year_rows)
+        for column, by_year in other.counts.items():
+            for year, values in by_year.items():
+                self.counts.setdefault(column, {}).setdefault(year, Counter()).update(values)
+        return self
+
+    @property
+    def rows(self):
+        return sum(self.year_rows.values())
+
+    def totals(self, column, year=None):
+        by_year = self.counts.get(column, {})
+        if year is not None:
+            return Counter(by_year.get(year, {}))
+        total = Counter()
+        for values in by_year.values():
+            total.update(values)
+        return total
+
+    def kpis(self, year=None):
+        gender = self.totals('GENDER', year)
+        organ = self.totals('ORGAN_FLAG', year)
+        nationality = self.totals('NATIONALITY_GROUP', year)
+        # Same definition gender_organ_ratio.py always printed
+        gender_total = sum(gender.values())
+        female_share = gender['FEMALE'] / gender_total if gender_total else 0
+        male_share = gender['MALE'] / gender_total if gender['MALE'] else 1
+        organ_total = sum(organ.values())
+        return {
+            'licenses': self.year_rows[year] if year is not None else self.rows,
+            'female_to_male_ratio': female_share / male_share,
+            'organ_flag_count': organ['YES'],
+            'organ_flag_share': organ['YES'] / organ_total if organ_total else 0,
+            'top_nationality_group': nationality.most_common(1)[0][0] if nationality else None,
+        }
+
+    def to_dict(self):
+        years = sorted(self.year_rows)
+        return {
+            'rows': self.rows,
+            'kpis': self.kpis(),
+            'years': {year: self.kpis(year) for year in years},
+            'counts': {column: dict(self.totals(column).most_common()) for column in self.columns},
+            'shares': {column: shares(self.totals(column)) for column in self.columns},
+            'counts_by_year': {column: {year: dict(values) for year, values in sorted(by_year.items())}
+                               for column, by_year in self.counts.items()},
+            'year_rows': dict(sorted(self.year_rows.items())),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(list(data['counts_by_year']))
+        summary.year_rows = Counter(data['year_rows'])
+        summary.counts = {column: {year: Counter(values) for year, values in by_year.items()}
+                          for column, by_year in data['counts_by_year'].items()}
+        return summary
+
+
+def shares(counts):
+    total = sum(counts.values())
+    return {value: n / total for value, n in counts.most_common()} if total else {}
+
+
+def summary_columns(license_file, columns=SUMMARY_COLUMNS):
+    names = pd.read_csv(license_file, nrows=0, skipinitialspace=True).columns
+    return names.tolist(), [column for column in [DATE_COLUMN, *columns] if column in names]
+
+
+def summarize_range(license_file, start, end, names, usecols, columns):
+    from filter_data import read_range
+    chunk = read_range(license_file, start, end, names, usecols=usecols, skipinitialspace=True)
+    return LicenseSummary(columns).update(chunk)
+
+
+def summarize(license_file, columns=SUMMARY_COLUMNS, chunksize=CHUNK_ROWS, workers=1):
+    """One pass over a license file, reading only the summarized columns
+
+    With workers > 1 line-aligned byte blocks are summarized on a process
+    pool and the partial counts merged.
+    """
+    names, usecols = summary_columns(license_file, columns)
+    summary = LicenseSummary(columns)
+    if workers <= 1:
+        for chunk in pd.read_csv(license_file, usecols=usecols, skipinitialspace=True, chunksize=chunksize):
+            summary.update(chunk)
+        return summary
+
+    from filter_data import byte_ranges
+    ranges = byte_ranges(license_file)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(summarize_range, license_file, start, end, names, usecols, columns)
+                   for start, end in ranges]
+        for future in futures:
+            summary.merge(future.result())
+    return summary
+
+
+def summary_path(license_file, cache_dir=CACHE_DIR):
+    return Path(cache_dir) / f'{Path(license_file).name}.summary.json'
+
+
+def read_summary(license_file, cache_dir=CACHE_DIR, source_version=None):
+    """Stored summary JSON when it was built from the current license file, else None"""
+    try:
+        with open(summary_path(license_file, cache_dir), 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('format') != SUMMARY_FORMAT or data.get('source') != (source_version or file_version(license_file)):
+        return None
+    return data
+
+
+def write_summary(summary, license_file, cache_dir=CACHE_DIR):
+    path = summary_path(license_file, cache_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {'format': SUMMARY_FORMAT, 'source': file_version(license_file),
+            'file': Path(license_file).name, **summary.to_dict()}
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+    return data
+
+
+def load_license_summary(license_file, cache_dir=CACHE_DIR):
+    """Summary JSON for a license file, recomputed in one streaming pass when stale"""
+    data = read_summary(license_file, cache_dir)
+    if data is not None:
+        return data
+
+    summary = summarize(license_file)
+    try:
+        return write_summary(summary, license_file, cache_dir)
+    except OSError as e:
+        print(f"Warning: Could not write license summary: {e}")
+        return summary.to_dict()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize a license file in one streaming pass')
+    parser.add_argument('license_file', nargs='?', default='liz.csv')
+    parser.add_argument('--columns', nargs='+', default=SUMMARY_COLUMNS)
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=1, help='summarize blocks on this many processes')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--out', help='write the JSON here instead of the dashboard cache')
+    args = parser.parse_args()
+
+    summary = summarize(args.license_file, args.columns, args.chunksize, args.workers)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(summary.to_dict(), f, indent=2)
+        print(f"Wrote summary of {summary.rows} licenses to {args.out}")
+    else:
+        write_summary(summary, args.license_file, args.cache_dir)
+        print(f"Wrote summary of {summary.rows} licenses to {summary_path(args.license_file, args.cache_dir)}")
@@ -1,19 +1,48 @@
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output
 import logging
-from flask_caching import Cache
+import os
+from license_aggregates import load_license_aggregates
+from license_series import load_license_series
+from license_summary import load_license_summary
+from data_version import file_version
+from data_watcher import WATCH_INTERVAL, DataWatcher
+from figure_cache import FigureCache
+from shared_cache import register_stats_route
+from warm_up import WarmUp, register_ready_route
 
 # Configure logging
 logging.basicConfig(filename='error.log', level=logging.ERROR)
 
+# Categories the weekly license chart can be split by
+CATEGORY_OPTIONS = [
+    {'label': 'Gender', 'value': 'GENDER'},
+    {'label': 'Nationality Group', 'value': 'NATIONALITY_GROUP'}
+]
+
+class LicenseData:
+    """One consistent snapshot of the license aggregates, weekly series and summary"""
+
+    def __init__(self, license_file):
+        self.license_file = license_file
+        self.version = file_version(license_file)
+        # Charts only need counts, which are kept up to date as liz.csv grows
+        self.aggregates = load_license_aggregates(license_file)
+        self.series = load_license_series(license_file, aggregates=self.aggregates)
+        self.summary = load_license_summary(license_file)
+
+
 class LicenseDashboard:
-    def __init__(self, license_file='liz.csv'):
+    def __init__(self, license_file='liz.csv', preload_figures=False):
         self.license_file = license_file
-        self.license_df = None
+        self.data = None
+        self.watcher = None
+        self.warm_up = None
+        self.figures = FigureCache()
+        self.preload_figures = preload_figures
         self.colors = {
             'background': '#000000',  # Changed to black
             'text': '#FFFFFF',
@@ -27,19 +56,52 @@ class LicenseDashboard:
         
     def load_data(self):
         try:
-            self.license_df = pd.read_csv(self.license_file, skipinitialspace=True)
-            self.license_df['FIRST_ISSUEDATE'] = pd.to_datetime(self.license_df['FIRST_ISSUEDATE'])
-            self.license_df['AGE'] = self.license_df['FIRST_ISSUEDATE'].dt.year - self.license_df['BIRTHYEAR']
-            self.license_df['MONTH'] = self.license_df['FIRST_ISSUEDATE'].dt.month
-            self.license_df['YEAR'] = self.license_df['FIRST_ISSUEDATE'].dt.year
+            self.data = LicenseData(self.license_file)
         except Exception as e:
             logging.error("Error loading data: %s", e)
+
+    def reload_data(self):
+        self.data = LicenseData(self.license_file)
+        if self.preload_figures:
+            self.figures.warm()
         
-    def create_dashboard(self):
-        app = dash.Dash(__name__)
-        cache = Cache(app.server, config={'CACHE_TYPE': 'simple'})
+    def warm_up_stages(self):
+        return {'figures': self.figures.warm} if self.preload_figures else {}
+
+    def create_kpi_cards(self, data):
+        """Headline figures from the precomputed license summary"""
+        kpis = data.summary['kpis'] if data and data.summary else {}
+        cards = [
+            ('Licenses Issued', f"{kpis['licenses']:,}" if 'licenses' in kpis else '-'),
+            ('Female to Male Ratio', f"{kpis['female_to_male_ratio']:.2f}" if 'female_to_male_ratio' in kpis else '-'),
+            ('Organ Donors', f"{kpis['organ_flag_count']:,} ({kpis['organ_flag_share']:.1%})" if 'organ_flag_count' in kpis else '-'),
+            ('Top Nationality Group', kpis.get('top_nationality_group') or '-'),
+        ]
+        return html.Div(style={
+            'display': 'flex',
+            'flexWrap': 'wrap',
+            'gap': '20px',
+            'margin': '20px 0'
+        }, children=[
+            html.Div(style={
+                'flex': '1',
+                'minWidth': '200px',
+                'backgroundColor': '#000000',
+                'padding': '20px',
+                'borderRadius': '10px',
+                'color': self.colors['text'],
+                'border': '1px solid #333',
+                'textAlign': 'center'
+            }, children=[
+                html.H3(label, style={'color': self.colors['neon_pink']}),
+                html.P(value, style={'color': self.colors['neon_green'], 'fontSize': '1.8em', 'margin': '0'})
+            ]) for label, value in cards
+        ])
+
+    def create_layout(self):
+        data = self.data
         
-        app.layout = html.Div(style={
+        return html.Div(style={
             'backgroundColor': self.colors['background'], 
             'padding': '20px',
             'minHeight': '100vh',
@@ -53,6 +115,7 @@ class LicenseDashboard:
             
             # License Section
             html.H2('License Dashboard', style={'color': self.colors['neon_pink'], 'textAlign': 'center'}),
+            self.create_kpi_cards(data),
             html.Div(style={
                 'display': 'flex',
                 'flexWrap': 'wrap',
@@ -103,10 +166,7 @@ class LicenseDashboard:
                     html.Div(style={'display': 'flex', 'gap': '10px'}, children=[
                         dcc.Dropdown(
                             id='license-category-selector',
-                            options=[
-                                {'label': 'Gender', 'value': 'GENDER'},
-                                {'label': 'Nationality Group', 'value': 'NATIONALITY_GROUP'}
-                            ],
+                            options=CATEGORY_OPTIONS,
                             value='GENDER',
                             style={
                                 'width': '200px',
@@ -116,8 +176,8 @@ class LicenseDashboard:
                         ),
                         dcc.Dropdown(
                             id='year-selector',
-                            options=[{'label': str(year), 'value': year} for year in sorted(self.license_df['YEAR'].unique())],
-                            value=self.license_df['YEAR'].max(),
+                            options=[{'label': str(year), 'value': year} for year in data.aggregates.years],
+                            value=data.aggregates.years[-1],
                             style={
                                 'width': '200px',
                                 'backgroundColor': self.colors['background'],
@@ -129,31 +189,33 @@ class LicenseDashboard:
                 ])
             ])
         ])
+
+    def create_dashboard(self, watch_interval=WATCH_INTERVAL, **dash_kwargs):
+        app = dash.Dash(__name__, **dash_kwargs)
+        register_stats_route(app.server, [self.figures])
+        data_version = lambda: (os.path.abspath(self.license_file), self.data.version)
+        categories = lambda: [option['value'] for option in CATEGORY_OPTIONS]
         
-        @cache.memoize(timeout=60)
-        def get_license_counts(selected_category, selected_year):
-            return self.license_df[self.license_df['YEAR'] == selected_year].groupby([selected_category, pd.Grouper(key='FIRST_ISSUEDATE', freq='W')]).size().reset_index(name='COUNT')
-        
-        @cache.memoize(timeout=60)
-        def get_age_counts():
-            return self.license_df.groupby('AGE').size().reset_index(name='COUNT')
+        app.layout = self.create_layout
         
-        @cache.memoize(timeout=60)
-        def get_monthly_counts():
-            return self.license_df.groupby(['YEAR', 'MONTH']).size().reset_index(name='COUNT')
+        # Rebuild the snapshot in the background whenever liz.csv changes
+        if watch_interval and self.watcher is None:
+            self.watcher = DataWatcher([self.license_file], self.reload_data, watch_interval).start()
         
         @app.callback(
             Output('license-line-chart', 'figure'),
             [Input('license-category-selector', 'value'),
              Input('year-selector', 'value')]
         )
+        @self.figures.cached(data_version, inputs=lambda: [categories(), self.data.aggregates.years])
         def update_license_line_chart(selected_category, selected_year):
-            if selected_category not in self.license_df.columns:
+            data = self.data
+            if selected_category not in data.series.categories:
                 return go.Figure()  # Return an empty figure if column is missing
             
-            license_counts = get_license_counts(selected_category, selected_year)
+            license_counts = data.series.weekly_counts(selected_category, selected_year)
             try:
-                fig = px.line(license_counts, x='FIRST_ISSUEDATE', y='COUNT', color=selected_category, title=f'License Issued by {selected_category} in {selected_year}')
+                fig = px.line(license_counts, x='FIRST_ISSUEDATE', y='COUNT', color=selected_category, title=f'License Issued by {selected_category} in {selected_year}', render_mode='svg')
                 fig.update_traces(line=dict(width=3, shape='spline'))
                 fig.update_layout(
                     xaxis_title='Issue Date',  # Updated x-axis title
@@ -171,10 +233,12 @@ class LicenseDashboard:
             Output('age-bubble-chart', 'figure'),
             [Input('license-category-selector', 'value')]
         )
+        @self.figures.cached(data_version, inputs=lambda: [categories()])
         def update_age_bubble_chart(selected_category):
+            data = self.data
             try:
-                age_counts = get_age_counts()
-                mean_age = (self.license_df['AGE'].mean())
+                age_counts = data.aggregates.age_counts()
+                mean_age = data.aggregates.mean_age()
                 fig = px.scatter(age_counts, x='AGE', y='COUNT', size='COUNT', title='',  # Removed title
                                  color_discrete_sequence=[self.colors['neon_blue']])  # Changed color to neon blue
                 fig.add_annotation(
@@ -199,10 +263,11 @@ class LicenseDashboard:
             Output('annual-license-line-chart', 'figure'),
             [Input('license-category-selector', 'value')]
         )
+        @self.figures.cached(data_version, inputs=lambda: [categories()])
         def update_annual_license_line_chart(selected_category):
-            monthly_counts = get_monthly_counts()
+            monthly_counts = self.data.aggregates.monthly_counts()
             try:
-                fig = px.line(monthly_counts, x='MONTH', y='COUNT', color='YEAR', title='Annual License Issue')
+                fig = px.line(monthly_counts, x='MONTH', y='COUNT', color='YEAR', title='Annual License Issue', render_mode='svg')
                 fig.update_traces(line=dict(width=3, shape='spline'))
                 fig.update_layout(
                     xaxis=dict(tickmode='array', tickvals=list(range(1, 13)), ticktext=['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']),
@@ -217,10 +282,14 @@ class LicenseDashboard:
                 logging.error("Error creating annual license line chart: %s", e)
                 return None
         
+        self.warm_up = WarmUp(self.warm_up_stages()).start()
+        register_ready_route(app.server, self.warm_up)
+        
         return app
     
     def run_dashboard(self, debug=True):
         app = self.create_dashboard()
+        self.warm_up.wait()
         app.run_server(debug=debug)
 
 if __name__ == "__main__":
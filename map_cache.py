@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+
+
+class MapCache:
+    """In-memory LRU of rendered choropleth HTML keyed by (year, theme, data version)"""
+
+    def __init__(self, render, max_entries=16):
+        # render(year) -> HTML string for that year's map
+        self.render = render
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, year, theme, version=None):
+        return (int(year), theme, version)
+
+    def get(self, year, theme, version=None, render=None):
+        """Cached map for year; render overrides the default renderer, e.g. to pin a data snapshot"""
+        key = self.key(year, theme, version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        # Render outside the lock so a slow year does not block lookups of cached ones
+        html = (render or self.render)(year)
+
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def warm(self, years, theme, version=None, render=None):
+        for year in years:
+            self.get(year, theme, version, render)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def retain(self, version):
+        """Drop maps rendered from any other data version"""
+        with self._lock:
+            for key in [key for key in self._entries if key[2] != version]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
@@ -0,0 +1,92 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Compact dtype per column: repeated strings become categoricals, small integers
+# the narrowest type that holds them (or its nullable twin when there are gaps)
+ACCIDENT_SCHEMA = {
+    'ZONE': 'category',
+    'ACCIDENT_TIME': 'category',
+    'ACCIDENT_YEAR': 'int16',
+    'ACCIDENT_SEVERITY': 'category',
+    'DEATH_COUNT': 'int16',
+    'ACCIDENT_NATURE': 'category',
+    'ACCIDENT_REASON': 'category',
+    'NATIONALITY_GROUP_OF_ACCIDENT_': 'category',
+    'BIRTH_YEAR_OF_ACCIDENT_PERPETR': 'int16',
+    'HOUR': 'uint8',
+    'AGE': 'int16',
+}
+
+LICENSE_SCHEMA = {
+    'BIRTHYEAR': 'int16',
+    'GENDER': 'category',
+    'NATIONALITY_GROUP': 'category',
+    'ORGAN_FLAG': 'category',
+    'YEAR': 'int16',
+    'MONTH': 'uint8',
+    'AGE': 'int16',
+}
+
+NULLABLE = {'int8': 'Int8', 'int16': 'Int16', 'int32': 'Int32', 'uint8': 'UInt8', 'uint16': 'UInt16'}
+
+
+def read_dtypes(schema):
+    """The part of a schema read_csv can apply while parsing, so strings never land as objects"""
+    return {column: dtype for column, dtype in schema.items() if dtype == 'category'}
+
+
+def compact_column(values, dtype):
+    """values as dtype, nullable when there are gaps; left as they are when they do not fit"""
+    if dtype == 'category':
+        return values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+    if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return values
+
+    present = values.dropna()
+    info = np.iinfo(dtype)
+    if len(present) and (present.min() < info.min or present.max() > info.max or (present % 1 != 0).any()):
+        return values
+    return values.astype(NULLABLE[dtype] if len(present) < len(values) else dtype)
+
+
+def apply_schema(df, schema):
+    """Convert the schema's columns present in df in place"""
+    for column, dtype in schema.items():
+        if column in df.columns:
+            df[column] = compact_column(df[column], dtype)
+    return df
+
+
+def memory_report(before, after):
+    """Per-column MB before and after compaction, with a total row"""
+    report = pd.DataFrame({
+        'before_mb': before.memory_usage(index=False, deep=True) / 2**20,
+        'after_mb': after.memory_usage(index=False, deep=True) / 2**20,
+    })
+    report.loc['total'] = report.sum()
+    report['dtype'] = pd.concat([after.dtypes.astype(str), pd.Series({'total': ''})])
+    return report.round(2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report the memory the compact schema saves on a data file')
+    parser.add_argument('path', nargs='?', default='facc.csv')
+    parser.add_argument('--schema', choices=['accidents', 'licenses'], default='accidents')
+    args = parser.parse_args()
+
+    if args.schema == 'accidents':
+        from accident_data import clean_accidents, read_accidents_csv
+        before = clean_accidents(pd.read_csv(args.path, skipinitialspace=True))
+        after = read_accidents_csv(args.path)
+    else:
+        before = pd.read_csv(args.path, skipinitialspace=True)
+        after = apply_schema(pd.read_csv(args.path, skipinitialspace=True, dtype=read_dtypes(LICENSE_SCHEMA)),
+                             LICENSE_SCHEMA)
+
+    report = memory_report(before, after)
+    print(report.to_string())
+    total = report.loc['total']
+    print(f"{total['before_mb']:.1f} MB -> {total['after_mb']:.1f} MB "
+          f"({total['before_mb'] / max(total['after_mb'], 1e-9):.1f}x smaller)")
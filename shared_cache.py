@@ -0,0 +1,284 @@
+import functools
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+CACHE_DIR = os.path.join('.cache', 'dash')
+MAX_BYTES = 256 * 1024 * 1024
+MAX_ENTRIES = 512
+# The directory is pruned each time this share of max_bytes has been written
+PRUNE_FRACTION = 16
+
+# A miss is told apart from a cached None by this marker
+MISSING = object()
+
+
+class MemoryBackend:
+    """Process-local LRU, for single-process runs and tests"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return MISSING
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return {'entries': len(self._entries)}
+
+
+class FileSystemBackend:
+    """Pickled entries in one directory, shared by every worker on the host
+
+    Reads bump the file's mtime, so pruning the oldest mtimes once the
+    directory outgrows max_bytes evicts the least recently used entries.
+    Listing the directory costs a stat per entry, so it is only pruned
+    after every max_bytes / PRUNE_FRACTION written by this process.
+    """
+
+    name = 'filesystem'
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._written = 0
+
+    def path(self, key):
+        return self.directory / f'{key}.pkl'
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return MISSING
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Truncated or unreadable entry: treat it as a miss and let set() replace it
+            return MISSING
+        return value
+
+    def set(self, key, value):
+        path = self.path(key)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._written += size
+            due = self._written >= self.max_bytes // PRUNE_FRACTION
+        if due:
+            self.prune()
+
+    def entries(self):
+        found = []
+        for path in self.directory.glob('*.pkl'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            found.append((stat.st_mtime_ns, stat.st_size, path))
+        return found
+
+    def prune(self):
+        with self._lock:
+            self._written = 0
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def size(self):
+        entries = self.entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries)}
+
+
+class RedisBackend:
+    """Redis (or any server speaking its protocol) shared by every worker
+
+    Size limit and LRU eviction are the server's: run it with maxmemory
+    set and maxmemory-policy allkeys-lru.
+    """
+
+    name = 'redis'
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='traffiq:'):
+        if not HAS_REDIS:
+            raise ImportError('the redis package is required for the redis cache backend')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        return MISSING if data is None else pickle.loads(data)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+    def size(self):
+        return {'entries': sum(1 for _ in self.client.scan_iter(match=self.prefix + '*'))}
+
+
+def create_backend(spec=None):
+    """Backend from a spec such as 'memory', 'filesystem:/var/cache/traffiq' or 'redis://host:6379/0'
+
+    Defaults to the TRAFFIQ_CACHE environment variable, then the filesystem.
+    """
+    spec = spec or os.environ.get('TRAFFIQ_CACHE', 'filesystem')
+    if spec == 'memory':
+        return MemoryBackend()
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(spec)
+    if spec == 'filesystem' or spec.startswith('filesystem:'):
+        directory = spec.partition(':')[2] or CACHE_DIR
+        return FileSystemBackend(directory)
+    raise ValueError(f'Unknown cache backend: {spec}')
+
+
+def plain(value):
+    """value with numpy scalars turned into Python ones, so np.int64(2020) and 2020 share a key"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (tuple, list)):
+        return type(value)(plain(item) for item in value)
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    return value
+
+
+class SharedCache:
+    """Memoization over a pluggable backend, invalidated by data version instead of a TTL
+
+    Every key includes the version of the data the cached function reads,
+    so entries for an old version are simply never asked for again and
+    age out of the backend's LRU.
+    """
+
+    def __init__(self, backend=None, namespace='traffiq'):
+        self.backend = backend or create_backend()
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, name, args, kwargs, version):
+        raw = repr((self.namespace, name, plain(args), sorted(plain(kwargs).items()), version))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(self, key):
+        """Cached value or MISSING, counted as a hit or a miss"""
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            value = MISSING
+        self._count(value is not MISSING)
+        return value
+
+    def store(self, key, value):
+        try:
+            self.backend.set(key, value)
+        except Exception:
+            # A full disk or an unreachable server only costs the recomputation
+            pass
+
+    def memoize(self, version):
+        """Cache a function's results for as long as version() returns the same data version"""
+        def decorator(func):
+            name = f'{func.__module__}.{func.__qualname__}'
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = self.key(name, args, kwargs, version())
+                value = self.lookup(key)
+                if value is MISSING:
+                    value = func(*args, **kwargs)
+                    self.store(key, value)
+                return value
+            return wrapper
+        return decorator
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'namespace': self.namespace,
+            'backend': self.backend.name,
+            'pid': os.getpid(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+            **self.backend.size(),
+        }
+
+
+def register_stats_route(server, caches, route='/cache-stats'):
+    """Serve the hit/miss counters of this worker's caches as JSON on the Flask server"""
+    from flask import jsonify
+
+    def cache_stats():
+        return jsonify([cache.stats() for cache in caches])
+
+    server.add_url_rule(route, 'cache_stats', cache_stats)
@@ -0,0 +1,213 @@
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 500_000
+
+VIOLATION_COLUMNS = [
+    'lsr_lzy_d_lrdr_over_speed_radar',
+    'mkhlft_qt_lshr_ldwy_y_passing_traffic_signal_violations',
+    'mkhlft_lrshdt_walt_ltnbyh_guidlines_and_alarm_signals_violations',
+    'mkhlft_llwht_lm_dny_metallic_plates_violations',
+    'mkhlft_ltjwz_overtaking_violations',
+    'mkhlft_tsjyl_w_dm_tjdyd_lstmr_registration_and_form_non_renewal_violations',
+    'mkhlft_rkhs_lqyd_driving_licenses_violations',
+    'mkhlft_lhrk_lmrwry_traffic_movement_violations',
+    'mkhlft_qw_d_wltzmt_lwqwf_wlntzr_stand_and_wait_rules_and_obligations_violations',
+    'khr_other',
+]
+TOTAL_VIOLATIONS = 'mjmw_lmkhlft_lmrwry_total_traffic_violations'
+
+# Rough monthly volume per violation type, in the order of VIOLATION_COLUMNS
+VIOLATION_BASE_RATES = [110_000, 5_800, 3_800, 4_000, 250, 700, 100, 48_000, 27_000, 30_000]
+
+SEVERITIES = (['MINOR', 'MAJOR', 'FATAL'], [0.82, 0.155, 0.025])
+NATURES = (['COLLISION BETWEEN VEHICLES', 'COLLISION WITH PEDESTRIANS', 'COLLISION WITH FIXED OBJECT',
+            'ROLLOVER', 'RUN OFF ROAD', 'OTHER'], [0.62, 0.08, 0.14, 0.06, 0.05, 0.05])
+REASONS = (['SUDDEN DEVIATION', 'NOT LEAVING SAFE DISTANCE', 'SPEEDING', 'RUNNING RED LIGHT',
+            'DISTRACTION', 'OTHER'], [0.28, 0.24, 0.16, 0.07, 0.15, 0.10])
+NATIONALITY_GROUPS = (['ASIAN', 'QATARI', 'ARAB', 'GCC', 'AFRICAN', 'EUROPEAN', 'OTHER'],
+                      [0.52, 0.16, 0.17, 0.03, 0.06, 0.03, 0.03])
+GENDERS = (['MALE', 'FEMALE'], [0.76, 0.24])
+ORGAN_FLAGS = (['NO', 'YES'], [0.92, 0.08])
+
+# Accidents by hour of day: quiet nights, morning and evening rush peaks
+HOUR_WEIGHTS = np.array([2, 1.5, 1, 1, 1, 1.5, 3, 6, 7, 5, 4.5, 5, 5.5, 6, 6.5, 7, 7.5, 8, 7, 6, 5, 4, 3.5, 3])
+
+# Every "HH:MM" of the day, indexed by minute, so times are formatted with a take()
+TIME_LABELS = np.array([f'{m // 60:02d}:{m % 60:02d}' for m in range(24 * 60)], dtype=object)
+
+
+def zone_ids(polygons_file='qatar_zones_polygons.json'):
+    """Zone ids the map can draw, falling back to a plausible range without the polygons file"""
+    try:
+        with open(polygons_file, 'r') as f:
+            return sorted(json.load(f), key=int)
+    except (OSError, ValueError):
+        return [str(z) for z in range(1, 99)]
+
+
+def zone_weights(zones, rng, skew=1.1):
+    """Zipf-like popularity over a shuffled zone order: a few central zones dominate"""
+    ranks = rng.permutation(len(zones)) + 1
+    weights = 1.0 / ranks ** skew
+    return weights / weights.sum()
+
+
+def _choice(rng, spec, n):
+    values, p = spec
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=p)]
+
+
+def _chunk_sizes(rows, chunk_rows):
+    for start in range(0, rows, chunk_rows):
+        yield start, min(chunk_rows, rows - start)
+
+
+def accident_chunks(rows, seed=0, years=(2015, 2024), polygons_file='qatar_zones_polygons.json',
+                    unknown_zone_share=0.02, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames in facc.csv's schema, chunk by chunk"""
+    rng = np.random.default_rng(seed)
+    zones = np.asarray(zone_ids(polygons_file), dtype=object)
+    weights = zone_weights(zones, rng)
+    hour_p = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+
+    # Volumes grow a little every year
+    year_values = np.arange(years[0], years[1] + 1)
+    year_p = 1.04 ** (year_values - years[0])
+    year_p = year_p / year_p.sum()
+
+    for _, n in _chunk_sizes(rows, chunk_rows):
+        zone = zones[rng.choice(len(zones), n, p=weights)]
+        zone[rng.random(n) < unknown_zone_share] = ''
+
+        minutes = rng.choice(24, n, p=hour_p) * 60 + rng.integers(0, 60, n)
+        year = rng.choice(year_values, n, p=year_p)
+        severity = _choice(rng, SEVERITIES, n)
+        deaths = np.where(severity == 'FATAL', 1 + rng.poisson(0.15, n), 0)
+
+        age = np.clip(rng.normal(34, 11, n).round(), 18, 85).astype(np.int64)
+        birth_year = (year - age).astype(float)
+        birth_year[rng.random(n) < 0.01] = np.nan
+
+        yield pd.DataFrame({
+            'ZONE': zone,
+            'ACCIDENT_TIME': TIME_LABELS[minutes],
+            'ACCIDENT_YEAR': year,
+            'ACCIDENT_SEVERITY': severity,
+            'DEATH_COUNT': deaths,
+            'ACCIDENT_NATURE': _choice(rng, NATURES, n),
+            'ACCIDENT_REASON': _choice(rng, REASONS, n),
+            'NATIONALITY_GROUP_OF_ACCIDENT_': _choice(rng, NATIONALITY_GROUPS, n),
+            'BIRTH_YEAR_OF_ACCIDENT_PERPETR': birth_year,
+        })
+
+
+def license_chunks(rows, seed=0, start='2015-01-01', end='2024-12-31', chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames in License.csv / liz.csv's schema, chunk by chunk"""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, end, freq='D')
+    day_labels = np.asarray(days.strftime('%Y-%m-%d'), dtype=object)
+
+    # Fewer licenses in summer and on Fridays, slow growth over time
+    day_p = np.where(days.month.isin([7, 8]), 0.6, 1.0) * np.where(days.dayofweek == 4, 0.2, 1.0)
+    day_p = day_p * np.linspace(1.0, 1.3, len(days))
+    day_p = day_p / day_p.sum()
+
+    for _, n in _chunk_sizes(rows, chunk_rows):
+        day = rng.choice(len(days), n, p=day_p)
+        age = np.clip(18 + rng.gamma(2.0, 5.0, n).round(), 18, 75).astype(np.int64)
+        yield pd.DataFrame({
+            'FIRST_ISSUEDATE': day_labels[day],
+            'BIRTHYEAR': days.year.to_numpy()[day] - age,
+            'GENDER': _choice(rng, GENDERS, n),
+            'NATIONALITY_GROUP': _choice(rng, NATIONALITY_GROUPS, n),
+            'ORGAN_FLAG': _choice(rng, ORGAN_FLAGS, n),
+        })
+
+
+def violation_chunks(rows, seed=0, start='2015-01', window_months=2400, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames in viola.json's schema, one record per month
+
+    Months cycle through a window (200 years by default) so very large
+    outputs stay inside the range pandas timestamps can represent.
+    """
+    rng = np.random.default_rng(seed)
+    first = pd.Period(start, freq='M')
+    window = pd.period_range(first, periods=window_months, freq='M')
+    month_labels = np.asarray(window.strftime('%Y-%m'), dtype=object)
+    base = np.array(VIOLATION_BASE_RATES, dtype=float)
+    # Each violation type swings over a ten-year cycle by its own amplitude
+    amplitude = np.abs(rng.normal(0, 0.15, len(base)))
+
+    for offset, n in _chunk_sizes(rows, chunk_rows):
+        position = (offset + np.arange(n)) % window_months
+        month_of_year = window.month.to_numpy()[position]
+        # Summer dip plus a slow, bounded drift per violation type
+        season = np.where(np.isin(month_of_year, [7, 8]), 0.75, 1.0)[:, None]
+        drift = 1 + amplitude * np.sin(2 * np.pi * position[:, None] / 120)
+        counts = rng.poisson(base * season * drift).astype(float)
+
+        chunk = pd.DataFrame(counts, columns=VIOLATION_COLUMNS)
+        chunk.insert(0, 'month', month_labels[position])
+        chunk[TOTAL_VIOLATIONS] = counts.sum(axis=1)
+        yield chunk
+
+
+def write_csv(path, chunks):
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode='a' if i else 'w', header=not i, index=False)
+        rows += len(chunk)
+    return rows
+
+
+def write_json_records(path, chunks):
+    """Stream chunks into one JSON array of records without holding it in memory"""
+    rows = 0
+    with open(path, 'w') as f:
+        f.write('[')
+        for chunk in chunks:
+            if len(chunk):
+                f.write((',' if rows else '') + chunk.to_json(orient='records')[1:-1])
+                rows += len(chunk)
+        f.write(']')
+    return rows
+
+
+def write_accidents(path, rows, seed=0, **kwargs):
+    return write_csv(path, accident_chunks(rows, seed, **kwargs))
+
+
+def write_licenses(path, rows, seed=0, **kwargs):
+    return write_csv(path, license_chunks(rows, seed, **kwargs))
+
+
+def write_violations(path, rows, seed=0, **kwargs):
+    return write_json_records(path, violation_chunks(rows, seed, **kwargs))
+
+
+DATASETS = {
+    'accidents': ('facc.csv', write_accidents),
+    'licenses': ('License.csv', write_licenses),
+    'violations': ('viola.json', write_violations),
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stream synthetic accident, license and violation files')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for seed_offset, name in enumerate(args.datasets):
+        filename, writer = DATASETS[name]
+        written = writer(out_dir / filename, args.rows, seed=args.seed + seed_offset)
+        print(f"Wrote {written} rows to {out_dir / filename}")
@@ -0,0 +1,984 @@
+import numpy as np
+import pandas as pd
+
+from accident_data import clean_accidents
+
+
+def legacy_clean_accidents(df):
+    # The per-row cleaning acc.py used before the vectorized pipeline
+    df['ZONE'] = df['ZONE'].astype(str).str.strip()
+    df['ZONE'] = df['ZONE'].apply(lambda x:
+        str(int(float(x))) if x.replace('.', '').isdigit() else 'Unknown')
+    df['HOUR'] = df['ACCIDENT_TIME'].str.extract(r'(\d+)').astype(float)
+    return df
+
+
+def synthetic_accidents(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    zone_spellings = ['12', '12.0', ' 7 ', '7.9', '5.', '.5', '0', '69', 'abc', '', '-3', '1e3', 'Unknown']
+    time_spellings = ['08:15', '8:15 AM', '23:59', '0:05', 'noon', '', '14']
+    return pd.DataFrame({
+        'ZONE': rng.choice(zone_spellings, n),
+        'ACCIDENT_TIME': rng.choice(time_spellings, n),
+        'ACCIDENT_YEAR': rng.integers(2015, 2025, n),
+    })
+
+
+def test_clean_accidents_matches_legacy_logic():
+    raw = synthetic_accidents()
+    expected = legacy_clean_accidents(raw.copy())
+    result = clean_accidents(raw.copy())
+
+    assert isinstance(result['ZONE'].dtype, pd.CategoricalDtype)
+    assert result['ZONE'].astype(str).tolist() == expected['ZONE'].tolist()
+    np.testing.assert_array_equal(result['HOUR'].to_numpy(), expected['HOUR'].to_numpy())
+
+
+def test_clean_accidents_numeric_zone_column():
+    raw = pd.DataFrame({'ZONE': [12.0, 7.0, np.nan, 69.0], 'ACCIDENT_TIME': ['1:00', '2:00', None, '3:00']})
+    result = clean_accidents(raw)
+
+    assert result['ZONE'].astype(str).tolist() == ['12', '7', 'Unknown', '69']
+    np.testing.assert_array_equal(result['HOUR'].to_numpy(), [1.0, 2.0, np.nan, 3.0])
+
+
+def test_csv_zone_keys_match_the_inferred_read():
+    import io
+
+    from accident_data import read_accidents_csv
+
+    def legacy_read_zones(csv):
+        # The untyped read acc.py used before ZONE was parsed as a category
+        zones = pd.read_csv(io.StringIO(csv), skipinitialspace=True)['ZONE']
+        zones = zones.map(str).str.strip()  # pandas 2's astype(str) spelled NaN as 'nan'
+        return zones.map(lambda x: str(int(float(x))) if x.replace('.', '').isdigit() else 'Unknown').tolist()
+
+    # An all-numeric column is parsed as numbers without a dtype, a mixed one stays strings
+    for spellings in (['1e3', '01', '10', ' 7.0', '12.5', '-3', '', '1'],
+                      ['1e3', '01', '10', ' 7.0', 'Unknown', '']):
+        csv = 'ZONE,ACCIDENT_TIME\n' + ''.join(f'{zone},10:00\n' for zone in spellings)
+        zones = read_accidents_csv(io.StringIO(csv))['ZONE']
+        assert isinstance(zones.dtype, pd.CategoricalDtype)
+        assert zones.astype(str).tolist() == legacy_read_zones(csv)
+
+
+def test_snapshot_rebuilds_only_when_stale(tmp_path, monkeypatch):
+    import os
+
+    import accident_data
+
+    parses = []
+    read_accidents_csv = accident_data.read_accidents_csv
+    monkeypatch.setattr(accident_data, 'read_accidents_csv',
+                        lambda path: parses.append(path) or read_accidents_csv(path))
+
+    csv = tmp_path / 'facc.csv'
+    pd.DataFrame({'ZONE': ['1', '2'], 'ACCIDENT_TIME': '10:00', 'ACCIDENT_YEAR': [2020, 2021],
+                  'ACCIDENT_NATURE': 'COLLISION', 'DEATH_COUNT': 0}).to_csv(csv, index=False)
+    load = lambda **kwargs: accident_data.load_accidents(csv, tmp_path / 'snapshots', **kwargs)
+
+    first = load()
+    assert len(parses) == 1
+
+    # A fresh snapshot is memory-mapped back without touching the CSV parser
+    # (Feather hands the zone categories back as str rather than object, so compare them as labels)
+    pd.testing.assert_frame_equal(load().astype({'ZONE': str}), first.astype({'ZONE': str}))
+    assert len(parses) == 1
+
+    # Any change to the CSV rebuilds it
+    with open(csv, 'a') as f:
+        f.write('3,11:00,2022,COLLISION,0\n')
+    assert load()['ZONE'].astype(str).tolist() == ['1', '2', '3']
+    assert len(parses) == 2
+    load()
+    assert len(parses) == 2
+
+    # So does a format bump, even though the CSV is unchanged
+    monkeypatch.setattr(accident_data, 'SNAPSHOT_FORMAT', accident_data.SNAPSHOT_FORMAT + 1)
+    load()
+    assert len(parses) == 3
+    load()
+    assert len(parses) == 3
+
+    # Hashed sources survive an mtime-only change such as a copy
+    load(use_hash=True)
+    assert len(parses) == 4
+    os.utime(csv, ns=(0, 0))
+    load(use_hash=True)
+    assert len(parses) == 4
+
+
+def test_map_callbacks_are_isolated_under_concurrency(tmp_path, monkeypatch):
+    import json
+    import re
+    from concurrent.futures import ThreadPoolExecutor
+    from pathlib import Path
+
+    from acc import QatarAccidentsDashboard
+
+    repo = Path(__file__).resolve().parent
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'zone_names.json').write_text(json.dumps({'1': 'Zone One'}))
+
+    # Year Y has exactly Y - 2010 accidents, all in zone 1, so every response identifies its year
+    years = list(range(2015, 2025))
+    pd.DataFrame({
+        'ZONE': [1 for year in years for _ in range(year - 2010)],
+        'ACCIDENT_TIME': '10:00',
+        'ACCIDENT_YEAR': [year for year in years for _ in range(year - 2010)],
+        'ACCIDENT_NATURE': 'COLLISION',
+        'DEATH_COUNT': 0,
+    }).to_csv('facc.csv', index=False)
+
+    dashboard = QatarAccidentsDashboard(polygons_file=str(repo / 'qatar_zones_polygons.json'))
+    dashboard.map_cache.max_entries = 2  # keep evicting so the render path runs concurrently too
+    app = dashboard.create_dashboard()
+    callback = next(v['callback'] for k, v in app.callback_map.items() if 'map-iframe' in k)
+    update_map_and_stats = callback.__wrapped__
+
+    requested = years * 4
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(update_map_and_stats, requested))
+
+    assert not (tmp_path / 'assets' / 'map.html').exists()
+    for year, (map_html, stats) in zip(requested, responses):
+        count = year - 2010
+        assert re.search(rf'Accidents: {count}\b', map_html)
+        assert not re.search(rf'Accidents: (?!{count}\b)\d+', map_html)
+        assert stats[0].children[1].children == f'Accidents: {count}'
+
+
+def test_cleared_year_keeps_map_and_stats(tmp_path, monkeypatch):
+    import json
+    from pathlib import Path
+
+    import dash
+
+    from acc import QatarAccidentsDashboard
+
+    repo = Path(__file__).resolve().parent
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'zone_names.json').write_text(json.dumps({'1': 'Zone One'}))
+    pd.DataFrame({'ZONE': [1, 1], 'ACCIDENT_TIME': '10:00', 'ACCIDENT_YEAR': [2020, 2021],
+                  'ACCIDENT_NATURE': 'COLLISION', 'DEATH_COUNT': 0}).to_csv('facc.csv', index=False)
+
+    dashboard = QatarAccidentsDashboard(polygons_file=str(repo / 'qatar_zones_polygons.json'))
+    app = dashboard.create_dashboard(watch_interval=0)
+    callback = next(v['callback'] for k, v in app.callback_map.items() if 'map-iframe' in k)
+
+    assert callback.__wrapped__(None) == (dash.no_update, dash.no_update)
+
+
+def test_geojson_year_switch_patches_only_the_counts(tmp_path, monkeypatch):
+    import json
+    from pathlib import Path
+
+    import pytest
+    from dash import Patch
+
+    from acc import QatarAccidentsDashboard
+
+    repo = Path(__file__).resolve().parent
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('TRAFFIQ_MAP_MODE', 'geojson')
+    (tmp_path / 'zone_names.json').write_text(json.dumps({'1': 'Zone One'}))
+    pd.DataFrame({'ZONE': [1, 1, 1, 2], 'ACCIDENT_TIME': '10:00', 'ACCIDENT_YEAR': [2020, 2021, 2021, 2021],
+                  'ACCIDENT_NATURE': 'COLLISION', 'DEATH_COUNT': 0}).to_csv('facc.csv', index=False)
+
+    dashboard = QatarAccidentsDashboard(polygons_file=str(repo / 'qatar_zones_polygons.json'))
+    assert dashboard.map_mode == 'geojson'
+    app = dashboard.create_dashboard(watch_interval=0)
+    callback = next(v['callback'] for k, v in app.callback_map.items() if 'zone-choropleth' in k)
+
+    patch, stats = callback.__wrapped__(2021)
+    assert isinstance(patch, Patch)
+    operations = patch.to_plotly_json()['operations']
+    assert [op['location'] for op in operations] == [['data', 0, 'z'], ['data', 0, 'zmax']]
+    assert all(op['operation'] == 'Assign' for op in operations)
+    z = dict(zip(dashboard.zone_shapes.zone_ids, operations[0]['params']['value']))
+    assert (z['1'], z['2'], z['3']) == (2, 1, None)
+    assert operations[1]['params']['value'] == 2
+
+    monkeypatch.setenv('TRAFFIQ_MAP_MODE', 'svg')
+    with pytest.raises(ValueError):
+        QatarAccidentsDashboard(polygons_file=str(repo / 'qatar_zones_polygons.json'))
+
+
+def test_full_level_of_detail_is_exact(tmp_path):
+    import json
+
+    from zone_geometry import load_zone_lod, read_polygons
+
+    rng = np.random.default_rng(0)
+    zones = {str(z): {'coordinates': [{'lat': 25 + lat, 'lng': 51 + lng}
+                                      for lat, lng in rng.random((50, 2)).round(9)]}
+             for z in range(1, 4)}
+    polygons_file = tmp_path / 'zones.json'
+    polygons_file.write_text(json.dumps(zones))
+
+    lod = load_zone_lod(polygons_file)
+    reloaded = load_zone_lod(polygons_file)  # from the .npz this time
+    for zone_id, ring in read_polygons(polygons_file).items():
+        assert reloaded.get(zone_id, 'full', decimals=12) == ring.round(12).tolist()
+        assert len(lod.get(zone_id, 'low')) <= len(ring)
+
+
+def test_cube_marginals_match_groupby():
+    from accident_cube import AccidentCube
+
+    rng = np.random.default_rng(1)
+    n = 3000
+    df = pd.DataFrame({
+        'ACCIDENT_YEAR': rng.integers(2015, 2025, n),
+        'ZONE': pd.Categorical(rng.choice(['1', '7', '12', 'Unknown'], n)),
+        'ACCIDENT_NATURE': rng.choice(['COLLISION', 'ROLLOVER', None], n),
+        'AGE': pd.array(rng.choice([18, 30, 45, None], n), dtype='Int16'),
+        'DEATH_COUNT': rng.integers(0, 3, n),
+    })
+    cube = AccidentCube(df)
+
+    for dims in (['ZONE'], ['ACCIDENT_YEAR', 'ACCIDENT_NATURE'], ['AGE']):
+        expected = df.groupby(dims, observed=True).size()
+        got = cube.marginal(dims)
+        assert got.to_dict() == expected.to_dict()
+    expected = df[df['ACCIDENT_YEAR'] == 2020].groupby('ZONE', observed=True)['DEATH_COUNT'].sum()
+    assert cube.marginal(['ZONE'], where={'ACCIDENT_YEAR': 2020}, measure='deaths').to_dict() == expected.to_dict()
+    assert cube.marginal() == n
+
+
+def test_cube_with_more_cells_than_an_int64_key():
+    from accident_cube import AccidentCube
+
+    rng = np.random.default_rng(2)
+    dims = [f'd{i}' for i in range(8)]
+    df = pd.DataFrame({dim: rng.permutation(np.arange(600) % 300) for dim in dims})
+    cube = AccidentCube(df, dimensions=dims)
+
+    assert np.prod([float(size) for size in cube.shape]) > np.iinfo(np.int64).max
+    assert cube.marginal(['d0', 'd3']).to_dict() == df.groupby(['d0', 'd3']).size().to_dict()
+    assert cube.marginal(dims).sum() == len(df)
+
+
+def test_metrics_without_recent_years(tmp_path, monkeypatch):
+    from acc import QatarAccidentsDashboard
+
+    monkeypatch.chdir(tmp_path)
+    pd.DataFrame({'ZONE': [1, 2], 'ACCIDENT_TIME': '10:00', 'ACCIDENT_YEAR': [2015, 2016],
+                  'ACCIDENT_NATURE': 'COLLISION', 'DEATH_COUNT': [1, 0]}).to_csv('facc.csv', index=False)
+
+    metrics = QatarAccidentsDashboard(polygons_file='missing.json').calculate_metrics()
+    assert metrics['annual_avg'] == 0
+    assert metrics['total_accidents'] == 2
+
+
+def legacy_filter_licenses(source, output, start_date, end_date):
+    # The whole-file filter filter_data.py ran before it streamed
+    data = pd.read_csv(source)
+    data['FIRST_ISSUEDATE'] = pd.to_datetime(data['FIRST_ISSUEDATE'], errors='coerce', format='%Y-%m-%d')
+    data[(data['FIRST_ISSUEDATE'] >= start_date) & (data['FIRST_ISSUEDATE'] <= end_date)].to_csv(output, index=False)
+
+
+def test_stream_filter_output(tmp_path):
+    from datetime import datetime
+
+    from filter_data import stream_filter
+
+    source = tmp_path / 'License.csv'
+    source.write_text('BIRTHYEAR,GENDER,FIRST_ISSUEDATE\n'
+                      '1990,M,2019-12-31\n'
+                      '1985,F,2020-01-01\n'
+                      '2001,M,2024-12-31\n'
+                      '1970,F,2025-01-01\n'
+                      '1999,F,not a date\n')
+    start, end = datetime(2020, 1, 1), datetime(2024, 12, 31)
+
+    # Clean typed columns: same bytes as the old script
+    stream_filter(source, tmp_path / 'liz.csv', start, end, chunksize=2)
+    legacy_filter_licenses(source, tmp_path / 'legacy.csv', start, end)
+    assert (tmp_path / 'liz.csv').read_bytes() == (tmp_path / 'legacy.csv').read_bytes()
+
+    # Values are copied as source text, so a numeric column with gaps is not
+    # rewritten as floats the way the old script wrote it
+    source.write_text('BIRTHYEAR,GENDER,FIRST_ISSUEDATE\n1990,M,2020-01-05\n,F,2020-02-01\n')
+    stream_filter(source, tmp_path / 'liz.csv', start, end)
+    legacy_filter_licenses(source, tmp_path / 'legacy.csv', start, end)
+    assert (tmp_path / 'liz.csv').read_text().splitlines()[1:] == ['1990,M,2020-01-05', ',F,2020-02-01']
+    assert (tmp_path / 'legacy.csv').read_text().splitlines()[1] == '1990.0,M,2020-01-05'
+
+
+def write_license_rows(path, rows, mode='a'):
+    with open(path, mode) as f:
+        if mode == 'w':
+            f.write('FIRST_ISSUEDATE,BIRTHYEAR,GENDER,NATIONALITY_GROUP,ORGAN_FLAG\n')
+        for date, birth_year, gender in rows:
+            f.write(f'{date},{birth_year},{gender},ASIAN,NO\n')
+
+
+def refreshed_matches_rebuild(tmp_path, source, output):
+    from datetime import datetime
+
+    from filter_data import stream_filter
+    from license_aggregates import LicenseAggregates, read_aggregates
+
+    stream_filter(source, tmp_path / 'rebuilt.csv', datetime(2020, 1, 1), datetime(2024, 12, 31))
+    assert output.read_bytes() == (tmp_path / 'rebuilt.csv').read_bytes()
+    stored = read_aggregates(output, tmp_path / 'cache')
+    expected = LicenseAggregates.from_csv(output)
+    assert stored.monthly_counts().astype('int64').equals(expected.monthly_counts().astype('int64'))
+
+
+def refresh_licenses(tmp_path):
+    from datetime import datetime
+
+    from filter_data import refresh
+
+    return refresh(tmp_path / 'License.csv', tmp_path / 'liz.csv', datetime(2020, 1, 1), datetime(2024, 12, 31),
+                   block_bytes=64, cache_dir=tmp_path / 'cache')
+
+
+def test_refresh_appends_only_new_rows(tmp_path):
+    source, output = tmp_path / 'License.csv', tmp_path / 'liz.csv'
+    write_license_rows(source, [('2019-05-01', 1990, 'M'), ('2020-03-01', 1985, 'F'), ('2021-07-09', 2000, 'M')], 'w')
+    assert refresh_licenses(tmp_path) == 2
+
+    # A partial last line is left for the next refresh
+    write_license_rows(source, [('2022-01-02', 1999, 'F'), ('2030-01-01', 1999, 'F')])
+    with open(source, 'a') as f:
+        f.write('2023-02-02,1980,M,ASI')
+    assert refresh_licenses(tmp_path) == 1
+    assert output.read_text().splitlines()[-1] == '2022-01-02,1999,F,ASIAN,NO'
+
+    with open(source, 'a') as f:
+        f.write('AN,NO\n')
+    assert refresh_licenses(tmp_path) == 1
+    assert refresh_licenses(tmp_path) == 0
+    refreshed_matches_rebuild(tmp_path, source, output)
+
+
+def test_refresh_rebuilds_rewritten_or_truncated_source(tmp_path):
+    source, output = tmp_path / 'License.csv', tmp_path / 'liz.csv'
+    rows = [('2020-03-01', 1985, 'F'), ('2021-07-09', 2000, 'M'), ('2022-01-02', 1999, 'F')]
+    write_license_rows(source, rows, 'w')
+    assert refresh_licenses(tmp_path) == 3
+
+    # Same length, different bytes before the checkpoint offset
+    write_license_rows(source, [('2020-03-01', 1985, 'M'), *rows[1:]], 'w')
+    assert refresh_licenses(tmp_path) == 3
+    refreshed_matches_rebuild(tmp_path, source, output)
+
+    write_license_rows(source, rows[:1], 'w')
+    assert refresh_licenses(tmp_path) == 1
+    refreshed_matches_rebuild(tmp_path, source, output)
+
+
+def test_refresh_rebuilds_without_a_usable_checkpoint(tmp_path):
+    import json
+
+    from filter_data import checkpoint_path
+
+    source, output = tmp_path / 'License.csv', tmp_path / 'liz.csv'
+    write_license_rows(source, [('2020-03-01', 1985, 'F'), ('2021-07-09', 2000, 'M')], 'w')
+    assert refresh_licenses(tmp_path) == 2
+    checkpoint = json.loads(open(checkpoint_path(output)).read())
+
+    for broken in ['', '{"offset": ', '[]', json.dumps({k: v for k, v in checkpoint.items() if k != 'offset'}),
+                   json.dumps({**checkpoint, 'output_size': 'large'})]:
+        with open(checkpoint_path(output), 'w') as f:
+            f.write(broken)
+        assert refresh_licenses(tmp_path) == 2
+        refreshed_matches_rebuild(tmp_path, source, output)
+
+    import os
+    os.remove(checkpoint_path(output))
+    assert refresh_licenses(tmp_path) == 2
+    refreshed_matches_rebuild(tmp_path, source, output)
+
+
+def test_refresh_rebuilds_from_a_checkpoint_without_output_version(tmp_path):
+    import json
+
+    from filter_data import checkpoint_path, write_checkpoint
+
+    source, output = tmp_path / 'License.csv', tmp_path / 'liz.csv'
+    write_license_rows(source, [('2020-03-01', 1985, 'F'), ('2021-07-09', 2000, 'M')], 'w')
+    assert refresh_licenses(tmp_path) == 2
+
+    # As written before the output version was recorded
+    checkpoint = json.loads(open(checkpoint_path(output)).read())
+    del checkpoint['output_version']
+    write_checkpoint(output, checkpoint)
+    write_license_rows(source, [('2022-01-02', 1999, 'F')])
+
+    assert refresh_licenses(tmp_path) == 3
+    assert json.loads(open(checkpoint_path(output)).read())['output_version']
+    refreshed_matches_rebuild(tmp_path, source, output)
+
+
+def test_shared_cache_keys_and_pruning(tmp_path):
+    import numpy as np
+
+    from shared_cache import MISSING, PRUNE_FRACTION, FileSystemBackend, SharedCache
+
+    backend = FileSystemBackend(tmp_path, max_bytes=64 * 1024)
+    cache = SharedCache(backend, namespace='test')
+    calls = []
+
+    @cache.memoize(version=lambda: 'v1')
+    def square(year):
+        calls.append(year)
+        return year * year
+
+    assert square(2020) == square(np.int64(2020)) == 2020 * 2020
+    assert calls == [2020]
+
+    # Writes below the pruning threshold leave the directory alone
+    block = b'x' * (backend.max_bytes // PRUNE_FRACTION // 4)
+    for i in range(3):
+        backend.set(f'small{i}', block)
+    assert backend.size()['entries'] == 4
+    # Past max_bytes the oldest entries go once enough has been written
+    for i in range(PRUNE_FRACTION * 2):
+        backend.set(f'big{i}', block * 2)
+    assert backend.size()['bytes'] <= backend.max_bytes + backend.max_bytes // PRUNE_FRACTION
+    assert backend.get('small0') is MISSING
+
+
+def test_ivf_ranked_recall_against_exact_search():
+    import numpy as np
+    import pytest
+
+    from fingerprint_ann import IVFIndex, synthetic_fingerprints
+    from fingerprint_similarity import FingerprintIndex
+
+    fingerprints = synthetic_fingerprints(20_000)
+    exact, ivf = FingerprintIndex(fingerprints), IVFIndex.build(fingerprints)
+    with pytest.raises(TypeError):
+        ivf.ranked(0)
+
+    k, found = 10, 0
+    queries = np.random.default_rng(1).choice(len(exact), 100, replace=False)
+    for query in queries:
+        ids, scores = ivf.ranked(query, k)
+        truth_ids, truth_scores = exact.ranked(query, k)
+        assert len(ids) == k and np.all(np.diff(scores) <= 0)
+        # Ties between duplicate fingerprints make any of the tied rows a correct answer
+        found += np.sum(exact.vectors[ids] @ exact.vectors[query] >= truth_scores[-1] - 1e-6)
+    assert found / (k * len(queries)) >= 0.95
+
+
+def test_similarity_page_follows_the_month_and_the_index():
+    from pathlib import Path
+
+    import viola
+
+    repo = Path(__file__).resolve().parent
+    viola.violations = viola.ViolationData(str(repo / 'viola.json'))
+    app = viola.create_app(watch_interval=0)
+    # Called as the benchmark does, outside any request
+    update = next(v['callback'] for k, v in app.callback_map.items() if 'similarity-results.data' in k).__wrapped__
+
+    index = viola.violations.similarity_index
+    ranked, _ = index.ranked(3, limit=len(index))
+    rows, page_count, page, shown = update(3, 2, 10, 3)
+    assert (page, shown, page_count) == (2, 3, -(-len(index) // 10))
+    assert [row['Month'] for row in rows] == list(viola.violations.month_labels[ranked[20:30]])
+    # First load has no month shown yet and keeps the requested page
+    assert update(3, 2, 10, None)[2] == 2
+    # A new month starts again from its best match, in the same response
+    rows, _, page, shown = update(5, 2, 10, 3)
+    assert (page, shown) == (0, 5) and rows[0]['Similarity'] == '100.00%'
+
+
+def test_ivf_reachable_counts_only_probed_lists():
+    from fingerprint_ann import IVFIndex, synthetic_fingerprints
+
+    fingerprints = synthetic_fingerprints(5_000)
+    index = IVFIndex.build(fingerprints, n_lists=50, n_probe=4)
+    reachable = index.reachable(0)
+    assert reachable < len(index)
+    assert len(index.ranked(0, reachable + 100)[0]) == reachable
+
+
+def test_importing_viola_starts_nothing():
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    # A fresh interpreter, since other tests here have already built viola apps
+    check = ("import threading, viola; "
+             "assert viola.violations is None and viola.watcher is None and viola.warm_up is None; "
+             "assert not hasattr(viola, 'app') and threading.active_count() == 1")
+    subprocess.run([sys.executable, '-c', check], cwd=Path(__file__).resolve().parent, check=True)
+
+
+def test_data_plane_round_trip(tmp_path):
+    from data_plane import attach, frame_arrays, frame_from_arrays, publish
+
+    df = pd.DataFrame({
+        'ZONE': pd.Categorical(['10', '2', '10', None]),
+        'LEVEL': pd.Categorical(['low', 'high', 'low', 'high'], categories=['low', 'high'], ordered=True),
+        'DEATHS': pd.array([0, None, 2, 1], dtype='Int16'),
+        'YEAR': np.array([2020, 2021, 2021, 2022], dtype=np.int16),
+        'RATE': [0.5, 1.5, np.nan, 2.0],
+        'NATURE': ['A', 'B', None, 'A'],
+    })
+    arrays, layout = frame_arrays(df)
+    publish('frame', arrays, 'v1', layout, tmp_path)
+    assert attach('frame', 'v2', tmp_path) is None
+
+    restored = frame_from_arrays(*attach('frame', 'v1', tmp_path))
+    expected = df.astype({'NATURE': 'category'})
+    # Mapped read-only rather than copied
+    assert not restored['YEAR'].to_numpy().flags.writeable
+    # Categorical codes stay memory-mapped even in a copy, so their array class is not compared
+    pd.testing.assert_frame_equal(restored.copy(deep=True), expected, check_categorical=False)
+    for column in ('ZONE', 'LEVEL', 'NATURE'):
+        assert restored[column].cat.categories.equals(expected[column].cat.categories)
+    assert restored['LEVEL'].cat.ordered and restored['DEATHS'].isna().tolist() == [False, True, False, False]
+
+
+def test_data_plane_concurrent_publishers(tmp_path):
+    import subprocess
+    import sys
+    import threading
+    from pathlib import Path
+
+    from data_plane import attach, load_shared_frame, publish
+
+    publish('frame', {'x': np.zeros(3)}, 'start', plane_dir=tmp_path)
+    script = ("import sys, numpy as np; from data_plane import publish\n"
+              "for i in range(40): publish('frame', {'x': np.full(3, i)}, f'{sys.argv[1]}-{i}', plane_dir=sys.argv[2])")
+    publishers = [subprocess.Popen([sys.executable, '-c', script, name, str(tmp_path)],
+                                   cwd=Path(__file__).resolve().parent) for name in ('a', 'b')]
+    # A version directory is only removed once CURRENT has moved past it
+    current = tmp_path / 'frame' / 'CURRENT'
+    while any(p.poll() is None for p in publishers):
+        version = current.read_text()
+        if not (tmp_path / 'frame' / version).is_dir():
+            assert current.read_text() != version
+    assert all(p.returncode == 0 for p in publishers)
+    assert len([d for d in (tmp_path / 'frame').iterdir() if d.is_dir()]) == 1
+
+    # Workers finding the plane stale build it once between them
+    builds = []
+    def build():
+        builds.append(1)
+        return pd.DataFrame({'x': np.arange(1000)})
+    threads = [threading.Thread(target=load_shared_frame, args=('shared', 'v1', build, tmp_path)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+
+
+def test_benchmark_calls_draw_non_empty_figures(tmp_path, monkeypatch):
+    import plotly.graph_objects as go
+
+    import benchmark
+    import viola
+
+    benchmark.prepare_workdir(tmp_path, 600)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(viola, 'violations', None)
+    for name in benchmark.APPS:
+        app = benchmark.build_app(name)
+        for callback_id, calls in benchmark.callback_calls(app, 3).items():
+            if not callback_id.endswith('.figure'):
+                continue
+            for args in calls:
+                figure = app.callback_map[callback_id]['callback'].__wrapped__(*args)
+                data = figure.data if isinstance(figure, go.Figure) else figure['data']
+                assert len(data), (name, callback_id, args)
+
+
+def test_data_watcher_reloads_once_two_polls_agree(tmp_path):
+    from data_watcher import DataWatcher
+
+    path = tmp_path / 'facc.csv'
+    path.write_text('a\n1\n')
+    reloads = []
+    watcher = DataWatcher([str(path)], lambda: reloads.append(path.read_text()), interval=0)
+
+    assert not watcher.check()
+    path.write_text('a\n1\n2\n')
+    assert not watcher.check()
+    # Still being written: the version moved again, so it has to settle anew
+    path.write_text('a\n1\n2\n3\n')
+    assert not watcher.check() and not reloads
+    assert watcher.check() and reloads == ['a\n1\n2\n3\n']
+    assert not watcher.check() and watcher.reloads == 1
+
+    # A failed reload keeps the old snapshot and is reported, not raised
+    watcher.reload = lambda: 1 / 0
+    path.write_text('a\n4\n')
+    assert not watcher.check() and not watcher.check() and watcher.reloads == 1
+
+
+def test_figure_cache_keys_on_inputs_and_data_version():
+    import plotly.graph_objects as go
+
+    from figure_cache import FigureCache
+    from shared_cache import MemoryBackend
+
+    figures, version, drawn = FigureCache(MemoryBackend(4), warm_entries=4), ['v1'], []
+
+    @figures.cached(lambda: version[0], inputs=lambda: [[2020, 2021, 2022], ['A', 'B']])
+    def chart(year, kind):
+        drawn.append((year, kind))
+        if kind is None:
+            return None
+        return go.Figure(go.Bar(x=[kind], y=[year]))
+
+    first = chart(2020, 'A')
+    assert chart(2020, 'A') == first and first['data'][0]['y'] == [2020]
+    chart(2021, 'A')
+    assert drawn == [(2020, 'A'), (2021, 'A')]
+
+    # New data misses every entry drawn for the old version
+    version[0] = 'v2'
+    chart(2020, 'A')
+    assert drawn[-1] == (2020, 'A') and len(drawn) == 3
+
+    # Anything that is not a figure passes through and is not stored
+    assert chart(2020, None) is None and chart(2020, None) is None
+    assert drawn.count((2020, None)) == 2
+
+    # warm() draws what fits in the callback's share of the cache
+    figures.clear()
+    assert figures.warm() == 4 and figures.stats()['entries'] == 4
+    assert figures.stats()['hits'] == 1
+
+
+def test_compact_column_edge_cases():
+    from schema import LICENSE_SCHEMA, apply_schema, compact_column
+
+    assert compact_column(pd.Series([1, 255]), 'uint8').dtype == np.uint8
+    # Out of range, fractional or non-numeric values are left as they are rather than wrapped or truncated
+    assert compact_column(pd.Series([1, 256]), 'uint8').dtype == np.int64
+    assert compact_column(pd.Series([-1, 2]), 'uint8').tolist() == [-1, 2]
+    assert compact_column(pd.Series([1990.5, 2000.0]), 'int16').tolist() == [1990.5, 2000.0]
+    strings = pd.Series(['1990', '2000'])
+    assert compact_column(strings, 'int16') is strings
+    assert compact_column(pd.Series([True, False]), 'uint8').dtype == bool
+
+    # Gaps make the nullable twin, keeping them as NA instead of inventing zeros
+    gaps = compact_column(pd.Series([1990.0, np.nan, 2000.0]), 'int16')
+    assert gaps.dtype == 'Int16' and gaps.isna().tolist() == [False, True, False]
+    assert compact_column(pd.Series([np.nan, np.nan]), 'int16').dtype == 'Int16'
+
+    categories = pd.Series(['M', 'F', 'M']).astype('category')
+    assert compact_column(categories, 'category') is categories
+    df = apply_schema(pd.DataFrame({'GENDER': ['M', 'F'], 'MONTH': [1, 12], 'OTHER': [1.5, 2.5]}), LICENSE_SCHEMA)
+    assert df.dtypes.astype(str).tolist() == ['category', 'uint8', 'float64']
+
+
+def test_ready_route_answers_503_until_warm_up_finishes():
+    import threading
+
+    from flask import Flask
+
+    from warm_up import WarmUp, register_ready_route
+
+    release = threading.Event()
+    nested = WarmUp({'inner': lambda: None})
+    warm_up = WarmUp({'slow': release.wait, 'broken': lambda: 1 / 0, 'section': nested.run})
+    server = Flask(__name__)
+    register_ready_route(server, warm_up)
+    client = server.test_client()
+    assert server.extensions['warm_up'] is warm_up
+
+    assert client.get('/ready').status_code == 503
+    warm_up.start()
+    response = client.get('/ready')
+    assert response.status_code == 503 and response.get_json()['stages']['slow']['state'] in ('pending', 'running')
+
+    release.set()
+    assert warm_up.wait(10)
+    response = client.get('/ready')
+    stages = response.get_json()['stages']
+    # A failed stage still counts as finished; the work just happens on the first request
+    assert response.status_code == 200 and response.get_json()['ready']
+    assert stages['broken']['state'] == 'failed' and 'division' in stages['broken']['error']
+    assert stages['section']['stages']['inner']['state'] == 'done'
+
+
+def test_benchmark_runs_viola_past_the_webgl_threshold(tmp_path, monkeypatch):
+    import benchmark
+    import viola
+
+    # 1500 months draw 1500 points per line chart, where px.line would switch to WebGL
+    benchmark.prepare_workdir(tmp_path, 1500)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(viola, 'violations', None)
+    result = benchmark.run_worker('viola', 3)
+    assert len(result['callbacks']) == 3 and not benchmark.failed_callbacks(result)
+    assert all(stats['cold']['p95_ms'] > 0 for stats in result['callbacks'].values())
+
+
+def test_figure_caches_share_a_filesystem_backend(tmp_path):
+    import plotly.graph_objects as go
+
+    from figure_cache import FigureCache
+    from shared_cache import FileSystemBackend
+
+    drawn = []
+    def worker():
+        # What each gunicorn worker builds for itself, over the one cache directory
+        figures = FigureCache(FileSystemBackend(tmp_path))
+
+        @figures.cached(lambda: 'v1')
+        def chart(year):
+            drawn.append(year)
+            return go.Figure(go.Bar(y=[year]))
+        return figures, chart
+
+    (first, draw_first), (second, draw_second) = worker(), worker()
+    assert draw_first(2020) == draw_second(2020)
+    assert drawn == [2020] and second.stats()['hits'] == 1
+
+
+def test_license_dashboards_share_figures(tmp_path, monkeypatch):
+    import synthetic_data
+    from liz import LicenseDashboard
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('TRAFFIQ_CACHE', f'filesystem:{tmp_path / "shared"}')
+    synthetic_data.write_licenses(tmp_path / 'liz.csv', 500, 0, start='2020-01-01')
+
+    # Two workers serving the same liz.csv
+    charts = []
+    for dashboard in (LicenseDashboard(), LicenseDashboard()):
+        app = dashboard.create_dashboard(watch_interval=0)
+        callback = next(v['callback'] for k, v in app.callback_map.items() if k == 'age-bubble-chart.figure')
+        charts.append((dashboard, callback.__wrapped__('GENDER')))
+
+    (first, drawn), (second, served) = charts
+    assert served == drawn and len(served['data'])
+    assert first.figures.stats()['misses'] == 1 and second.figures.stats()['hits'] == 1
+
+
+def test_ivf_index_concurrent_writers(tmp_path):
+    import json
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    script = ("import sys; from fingerprint_ann import IVFIndex, synthetic_fingerprints, write_ivf_index\n"
+              "index = IVFIndex.build(synthetic_fingerprints(500), n_lists=5)\n"
+              "for i in range(30): write_ivf_index(index, sys.argv[2], f'{sys.argv[1]}-{i}')")
+    writers = [subprocess.Popen([sys.executable, '-c', script, name, str(tmp_path)],
+                                cwd=Path(__file__).resolve().parent) for name in ('a', 'b')]
+    # Arrays are only removed once meta.json has moved on to others
+    meta = tmp_path / 'meta.json'
+    while any(p.poll() is None for p in writers):
+        try:
+            current = meta.read_text()
+        except FileNotFoundError:
+            continue
+        if not all((tmp_path / name).exists() for name in json.loads(current)['files'].values()):
+            assert meta.read_text() != current
+    assert all(p.returncode == 0 for p in writers)
+
+    from fingerprint_ann import open_ivf_index
+    assert len(open_ivf_index(tmp_path)) == 500
+    assert len(list(tmp_path.glob('*.npy'))) == 5
+
+
+def test_source_change_swaps_the_snapshot(tmp_path, monkeypatch):
+    import json
+    from pathlib import Path
+
+    from acc import QatarAccidentsDashboard
+    from data_watcher import DataWatcher
+
+    repo = Path(__file__).resolve().parent
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'zone_names.json').write_text(json.dumps({'1': 'Zone One'}))
+    def write_accidents(years):
+        pd.DataFrame({'ZONE': 1, 'ACCIDENT_TIME': '10:00', 'ACCIDENT_YEAR': years,
+                      'ACCIDENT_NATURE': 'COLLISION', 'DEATH_COUNT': 0}).to_csv('facc.csv', index=False)
+
+    write_accidents([2020, 2021])
+    dashboard = QatarAccidentsDashboard(polygons_file=str(repo / 'qatar_zones_polygons.json'))
+    app = dashboard.create_dashboard(watch_interval=0)
+    old = dashboard.data
+    watcher = DataWatcher(['facc.csv'], dashboard.reload_data, interval=0)
+
+    write_accidents([2020, 2021, 2022, 2022])
+    assert not watcher.check() and dashboard.data is old
+    assert watcher.check() and dashboard.data is not old
+    assert dashboard.data.version != old.version and list(dashboard.data.year_index.years) == [2020, 2021, 2022]
+    # The old snapshot is left whole for callbacks still reading it
+    assert list(old.year_index.years) == [2020, 2021]
+
+    # New page loads and callbacks see the new data
+    callback = next(v['callback'] for k, v in app.callback_map.items() if 'map-iframe' in k).__wrapped__
+    assert callback(2022)[1][0].children[1].children == 'Accidents: 2'
+    assert '2022' in json.dumps(app.layout().to_plotly_json(), default=str)
+
+
+def test_lazy_sections_route_and_build_once():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from flask import Flask, request
+
+    from home import LazySections
+
+    built = []
+    def build(prefix):
+        built.append(prefix)
+        section = Flask('section')
+        section.add_url_rule('/', 'index', lambda: f'section {request.script_root}')
+        section.add_url_rule('/page', 'page', lambda: f'page {request.script_root}')
+        return type('Section', (), {'server': section})()
+
+    landing = Flask('landing')
+    landing.add_url_rule('/', 'index', lambda: 'landing')
+    landing.add_url_rule('/<path:path>', 'other', lambda path: f'landing {path}')
+    landing.wsgi_app = LazySections(landing.wsgi_app, {'/accidents': build})
+    client = landing.test_client()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        pages = list(pool.map(lambda _: client.get('/accidents/page').text, range(16)))
+    assert pages == ['page /accidents'] * 16 and built == ['/accidents/']
+    assert client.get('/accidents').text == 'section /accidents'
+    # Unknown paths, and ones that only start with a prefix's letters, stay on the landing app
+    assert client.get('/').text == 'landing'
+    assert client.get('/license/').text == 'landing license/'
+    assert client.get('/accidentsx').text == 'landing accidentsx'
+    assert built == ['/accidents/']
+
+
+def test_importing_home_starts_nothing():
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    check = ("import threading, home; "
+             "assert home.warm_up is None and threading.active_count() == 1; "
+             "assert home.create_server('') is home.server and home.warm_up.wait(5); "
+             "assert home.server.test_client().get('/ready').status_code == 200")
+    subprocess.run([sys.executable, '-c', check], cwd=Path(__file__).resolve().parent, check=True)
+
+
+def test_year_index_ranges():
+    from year_index import YearIndex
+
+    df = pd.DataFrame({'ACCIDENT_YEAR': [2021, 2019, 2021, 2020, 2019], 'ROW': range(5)})
+    index = YearIndex(df, 'ACCIDENT_YEAR')
+    assert index.years == [2019, 2020, 2021] and 2020 in index and 2018 not in index
+    assert index.ranges == {2019: (0, 2), 2020: (2, 3), 2021: (3, 5)}
+    assert index.slice(2021)['ROW'].tolist() == [0, 2]
+    assert index.slice(np.int16(2019))['ROW'].tolist() == [1, 4]
+    assert index.slice(2018).empty
+
+    # Nullable years from the compact schema: keys stay ints and the gaps sort last, unindexed
+    nullable = pd.DataFrame({'ACCIDENT_YEAR': pd.array([2020, None, 2019, 2020], dtype='Int16'), 'ROW': range(4)})
+    index = YearIndex(nullable, 'ACCIDENT_YEAR')
+    assert all(type(year) is int for year in index.years) and index.years == [2019, 2020]
+    assert index.slice(2020)['ROW'].tolist() == [0, 3] and len(index.frame) == 4
+    assert YearIndex(nullable.iloc[[1]], 'ACCIDENT_YEAR').years == []
+
+
+def test_license_summary_matches_pandas(tmp_path, monkeypatch):
+    import functools
+
+    import pytest
+
+    import filter_data
+    import synthetic_data
+    from license_summary import summarize
+
+    path = tmp_path / 'liz.csv'
+    synthetic_data.write_licenses(path, 3000, 0, start='2020-01-01')
+    with open(path, 'a') as f:
+        f.write('not a date,1990,FEMALE,ARAB,YES\n2021-02-03,1980,,ASIAN,NO\n')
+    # Small blocks so the process pool really merges several partial summaries
+    monkeypatch.setattr(filter_data, 'byte_ranges', functools.partial(filter_data.byte_ranges, block_bytes=16 * 1024))
+
+    df = pd.read_csv(path, skipinitialspace=True)
+    years = pd.to_datetime(df['FIRST_ISSUEDATE'], errors='coerce').dt.year
+
+    def expected_kpis(rows):
+        gender = rows['GENDER'].value_counts(normalize=True)
+        organ = rows['ORGAN_FLAG'].value_counts()
+        return {
+            'licenses': len(rows),
+            'female_to_male_ratio': gender.get('FEMALE', 0) / gender.get('MALE', 1),
+            'organ_flag_count': organ.get('YES', 0),
+            'organ_flag_share': organ.get('YES', 0) / organ.sum(),
+            'top_nationality_group': rows['NATIONALITY_GROUP'].value_counts().idxmax(),
+        }
+
+    serial, pooled = summarize(path), summarize(path, workers=2)
+    assert len(filter_data.byte_ranges(path)) > 2
+    assert pooled.to_dict() == serial.to_dict()
+    assert serial.kpis() == pytest.approx(expected_kpis(df))
+    for year in years.dropna().unique():
+        assert serial.kpis(str(int(year))) == pytest.approx(expected_kpis(df[years == year]))
+    assert serial.year_rows['unknown'] == 1
+    shares = serial.to_dict()['shares']
+    for column in ('GENDER', 'ORGAN_FLAG', 'NATIONALITY_GROUP'):
+        assert shares[column] == pytest.approx(df[column].value_counts(normalize=True).to_dict())
+
+
+def test_license_series_matches_groupby(tmp_path):
+    from license_aggregates import LicenseAggregates
+    from license_series import LicenseSeries
+
+    # Sunday/Monday week edges, a week straddling New Year, weeks with no licenses and no 2021 at all
+    dates = ['2019-12-29', '2019-12-30', '2020-01-01', '2020-01-05', '2020-01-06', '2020-01-06', '2020-02-20',
+             '2020-12-31', '2022-01-02', '2022-01-03', '2022-06-15', '2022-12-31']
+    path = tmp_path / 'liz.csv'
+    pd.DataFrame({
+        'FIRST_ISSUEDATE': dates,
+        'BIRTHYEAR': 1990,
+        'GENDER': ['MALE', 'FEMALE'] * 6,
+        'NATIONALITY_GROUP': ['ARAB'] * 5 + ['ASIAN'] * 7,
+        'ORGAN_FLAG': 'NO',
+    }).to_csv(path, index=False)
+    series = LicenseSeries.from_aggregates(LicenseAggregates.from_csv(path))
+
+    df = pd.read_csv(path, skipinitialspace=True)
+    df['FIRST_ISSUEDATE'] = pd.to_datetime(df['FIRST_ISSUEDATE'])
+    df['YEAR'] = df['FIRST_ISSUEDATE'].dt.year
+    df['MONTH'] = df['FIRST_ISSUEDATE'].dt.month
+
+    def same(ours, theirs, keys):
+        ours = ours.astype({keys[0]: str, 'COUNT': 'int64'}).sort_values(keys).reset_index(drop=True)
+        theirs = theirs.astype({keys[0]: str, 'COUNT': 'int64'}).sort_values(keys).reset_index(drop=True)
+        pd.testing.assert_frame_equal(ours[keys + ['COUNT']], theirs[keys + ['COUNT']], check_dtype=False)
+
+    for category in ('GENDER', 'NATIONALITY_GROUP'):
+        weekly = lambda rows: (rows.groupby([category, pd.Grouper(key='FIRST_ISSUEDATE', freq='W')]).size()
+                               .reset_index(name='COUNT'))
+        for year in (2019, 2020, 2021, 2022):
+            rows = df[df['YEAR'] == year]
+            same(series.weekly_counts(category, year), weekly(rows), [category, 'FIRST_ISSUEDATE'])
+            same(series.monthly_counts(category, year),
+                 rows.groupby([category, 'MONTH']).size().reset_index(name='COUNT'), [category, 'MONTH'])
+        same(series.weekly_counts(category), weekly(df), [category, 'FIRST_ISSUEDATE'])
+    assert series.weekly_counts('GENDER', 2021).empty and series.years('GENDER') == [2019, 2020, 2022]
+
+
+def test_zone_store_round_trip(tmp_path):
+    import shutil
+    from pathlib import Path
+
+    from data_version import file_version
+    from zone_geometry import load_zone_store, open_zone_store, read_polygons
+
+    polygons_file = tmp_path / 'qatar_zones_polygons.json'
+    shutil.copy(Path(__file__).resolve().parent / 'qatar_zones_polygons.json', polygons_file)
+    load_zone_store(polygons_file, tmp_path / 'store')
+
+    store = open_zone_store(tmp_path / 'store', file_version(polygons_file))
+    assert isinstance(store.coords, np.memmap) and store.coords.dtype == np.float32
+    source = read_polygons(polygons_file)
+    assert sorted(store) == sorted(source) and len(store.coords) == sum(len(ring) for ring in source.values())
+    for zone_id, ring in source.items():
+        # float32 keeps about 7 significant digits, i.e. a few metres at these latitudes and longitudes
+        np.testing.assert_allclose(store[zone_id], ring, rtol=0, atol=1e-5)
+    assert store.get_zone('no such zone') is None and 'no such zone' not in store
+    assert open_zone_store(tmp_path / 'store', 'another source') is None
@@ -2,14 +2,19 @@ import pandas as pd
 import numpy as np
 import json
 import folium
+import branca.colormap as cm
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from dash import Dash, dcc, html, Input, Output
-from sklearn.metrics.pairwise import cosine_similarity
-from flask_caching import Cache
 import logging
 from pathlib import Path
+from accident_data import load_shared_accidents
+from data_version import file_version
+from license_series import LicenseSeries, load_license_series
+from shared_cache import SharedCache, register_stats_route
+from year_index import YearIndex
+from zone_geometry import load_zone_store
 
 # Configure logging
 logging.basicConfig(filename='error.log', level=logging.ERROR)
@@ -45,30 +50,26 @@ def create_fingerprint(df):
 
 # Initialize the Dash app
 app = Dash(__name__)
-cache = Cache(app.server, config={'CACHE_TYPE': 'simple'})
+cache = SharedCache(namespace='traffiq')
+register_stats_route(app.server, [cache])
 
 # Load data
 df_viola = load_json_data('viola.json')
 df_viola['month'] = pd.to_datetime(df_viola['month'])
 df_viola = df_viola.sort_values('month')
 fingerprints = create_fingerprint(df_viola)
-similarity_matrix = cosine_similarity(fingerprints)
 
-df_accidents = pd.read_csv('facc.csv', skipinitialspace=True)
-df_accidents['ZONE'] = df_accidents['ZONE'].astype(str).str.strip()
-df_accidents['ZONE'] = df_accidents['ZONE'].apply(lambda x: str(int(float(x))) if x.replace('.', '').isdigit() else 'Unknown')
-df_accidents['HOUR'] = df_accidents['ACCIDENT_TIME'].str.extract('(\d+)').astype(float)
+accidents_version = (str(Path('facc.csv').resolve()), file_version('facc.csv'))
+accident_years = YearIndex(load_shared_accidents('facc.csv'), 'ACCIDENT_YEAR')
+df_accidents = accident_years.frame
+zone_store = load_zone_store('qatar_zones_polygons.json')
 current_year = df_accidents['ACCIDENT_YEAR'].max()
 
 try:
-    df_license = pd.read_csv('liz.csv', skipinitialspace=True)
-    df_license['FIRST_ISSUEDATE'] = pd.to_datetime(df_license['FIRST_ISSUEDATE'])
-    df_license['AGE'] = df_license['FIRST_ISSUEDATE'].dt.year - df_license['BIRTHYEAR']
-    df_license['MONTH'] = df_license['FIRST_ISSUEDATE'].dt.month
-    df_license['YEAR'] = df_license['FIRST_ISSUEDATE'].dt.year
+    license_series = load_license_series('liz.csv')
 except Exception as e:
     logging.error(f"Error reading liz.csv: {e}")
-    df_license = pd.DataFrame(columns=['FIRST_ISSUEDATE', 'BIRTHYEAR', 'GENDER', 'NATIONALITY_GROUP'])
+    license_series = LicenseSeries({'categories': np.array([], dtype=str)})
 
 # App layout
 app.layout = html.Div(style={
@@ -98,7 +99,7 @@ app.layout = html.Div(style={
         html.Label('Select Year:', style={'fontWeight': 'bold', 'color': '#FF00FF'}),
         dcc.Dropdown(
             id='year-selector',
-            options=[{'label': str(year), 'value': year} for year in sorted(df_accidents['ACCIDENT_YEAR'].unique())],
+            options=[{'label': str(year), 'value': year} for year in accident_years.years],
             value=current_year,
             style={'width': '100%', 'backgroundColor': '#000000', 'color': 'black'}
         ),
@@ -128,7 +129,7 @@ def update_monthly_violation_line_chart(selected_violation):
     if selected_violation not in df_viola.columns:
         return go.Figure()
     monthly_data = df_viola.groupby([df_viola['month'].dt.year, df_viola['month'].dt.month])[selected_violation].sum().unstack(level=0)
-    fig = px.line(monthly_data, title=f'Monthly {selected_violation} Violations')
+    fig = px.line(monthly_data, title=f'Monthly {selected_violation} Violations', render_mode='svg')
     fig.update_traces(line=dict(width=4, shape='spline'))
     fig.update_layout(
         xaxis=dict(tickmode='array', tickvals=list(range(1, 13)), ticktext=['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']),
@@ -144,8 +145,13 @@ def update_monthly_violation_line_chart(selected_violation):
     [Input('year-selector', 'value')]
 )
 def update_accidents_map(selected_year):
-    year_data = df_accidents[df_accidents['ACCIDENT_YEAR'] == selected_year]
-    zone_counts = year_data['ZONE'].value_counts().to_dict()
+    return accidents_map_html(selected_year)
+
+@cache.memoize(version=lambda: accidents_version)
+def accidents_map_html(selected_year):
+    year_data = accident_years.slice(selected_year)
+    zone_counts = year_data['ZONE'].value_counts()
+    zone_counts = zone_counts[zone_counts > 0].to_dict()  # ZONE is categorical
     max_count = max(zone_counts.values()) if zone_counts else 1
     colormap = cm.LinearColormap(colors=['#F5F5DC', '#B03060', '#8B0000'], vmin=0, vmax=max_count)
     m = folium.Map(location=[25.2867, 51.5333], zoom_start=11, tiles='CartoDB positron', prefer_canvas=True)
@@ -153,9 +159,9 @@ def update_accidents_map(selected_year):
         if zone.lower() == 'unknown':
             continue
         zone_int = str(int(float(zone)))
-        zone_data = zones_data.get(zone_int)
-        if zone_data:
-            coordinates = [[p['lat'], p['lng']] for p in zone_data['coordinates']]
+        zone_ring = zone_store.get_zone(zone_int)
+        if zone_ring is not None:
+            coordinates = np.round(zone_ring.astype(np.float64), 6).tolist()
             opacity = 0.2 + (count / max_count * 0.8)
             folium.Polygon(
                 locations=coordinates,
@@ -167,19 +173,17 @@ def update_accidents_map(selected_year):
                 tooltip=f'Zone {zone_int}'
             ).add_to(m)
     colormap.add_to(m)
-    map_path = 'assets/map.html'
-    m.save(map_path)
-    return open(map_path, 'r').read()
+    return m.get_root().render()
 
 @app.callback(
     Output('license-line-chart', 'figure'),
     [Input('license-category-selector', 'value')]
 )
 def update_license_line_chart(selected_category):
-    if selected_category not in df_license.columns:
+    if selected_category not in license_series.categories:
         return go.Figure()
-    license_counts = df_license.groupby([selected_category, pd.Grouper(key='FIRST_ISSUEDATE', freq='W')]).size().reset_index(name='COUNT')
-    fig = px.line(license_counts, x='FIRST_ISSUEDATE', y='COUNT', color=selected_category, title=f'License Issued by {selected_category}')
+    license_counts = license_series.weekly_counts(selected_category)
+    fig = px.line(license_counts, x='FIRST_ISSUEDATE', y='COUNT', color=selected_category, title=f'License Issued by {selected_category}', render_mode='svg')
     fig.update_traces(line=dict(width=3, shape='spline'))
     fig.update_layout(
         xaxis_title='Issue Date',
@@ -191,5 +195,4 @@ def update_license_line_chart(selected_category):
     return fig
 
 if __name__ == '__main__':
-    Path('assets').mkdir(exist_ok=True)
     app.run_server(debug=True)
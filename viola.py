@@ -1,10 +1,20 @@
 import pandas as pd
 import numpy as np
-from dash import Dash, dcc, html, Input, Output
+from dash import Dash, dcc, html, dash_table, Input, Output, State
 import plotly.graph_objects as go
-from sklearn.metrics.pairwise import cosine_similarity
 import plotly.express as px
 import json
+import math
+import os
+import threading
+from data_version import file_version
+from data_watcher import WATCH_INTERVAL, DataWatcher
+from figure_cache import FigureCache
+from fingerprint_ann import load_similarity_index
+from shared_cache import register_stats_route
+from warm_up import WarmUp, register_ready_route
+
+VIOLATIONS_FILE = 'viola.json'
 
 def load_json_data(filename):
     """Load data from JSON file and clean it"""
@@ -70,30 +80,71 @@ violation_names = {
     'khr_other': 'Other'
 }
 
-# Initialize the Dash app
-app = Dash(__name__)
+SIMILARITY_PAGE_SIZE = 10
 
-try:
-    # Load and prepare data
-    print("Loading data...")
-    df = load_json_data('viola.json')
-    
-    print("\nConverting dates...")
-    df['month'] = pd.to_datetime(df['month'])
-    df = df.sort_values('month')
-    
-    print("\nCreating fingerprints...")
-    fingerprints = create_fingerprint(df)
-    print("Fingerprint shape:", fingerprints.shape)
-    
-    print("\nChecking for NaN values in fingerprints:")
-    print(fingerprints.isna().sum())
-    
-    print("\nCalculating similarity matrix...")
-    similarity_matrix = cosine_similarity(fingerprints)
+class ViolationData:
+    """One consistent snapshot of the monthly violations, their fingerprints and similarity index"""
+
+    def __init__(self, filename=VIOLATIONS_FILE):
+        self.version = file_version(filename)
+
+        # Load and prepare data
+        print("Loading data...")
+        df = load_json_data(filename)
+        
+        print("\nConverting dates...")
+        df['month'] = pd.to_datetime(df['month'])
+        self.df = df.sort_values('month')
+        
+        print("\nCreating fingerprints...")
+        self.fingerprints = create_fingerprint(self.df)
+        print("Fingerprint shape:", self.fingerprints.shape)
+        
+        print("\nChecking for NaN values in fingerprints:")
+        print(self.fingerprints.isna().sum())
+        
+        self.month_labels = self.df['month'].dt.strftime('%B %Y').to_numpy()
+        self._similarity_index = None
+        self._lock = threading.Lock()
+
+    @property
+    def similarity_index(self):
+        """Built on first use, normally by the warm-up stage rather than by a request"""
+        if self._similarity_index is None:
+            with self._lock:
+                if self._similarity_index is None:
+                    print("\nIndexing fingerprints...")
+                    # Exact for a few hundred months, a memory-mapped IVF index once there are millions of periods
+                    self._similarity_index = load_similarity_index(self.fingerprints, '.cache/viola_fingerprints',
+                                                                   self.version)
+        return self._similarity_index
+
+# Current snapshot, swapped whole by reload_data() so a callback that reads it once stays consistent
+violations = None
+watcher = None
+warm_up = None
+
+figures = FigureCache()
+preload_figures = False
 
-    # App layout
-    app.layout = html.Div(style={
+def reload_data():
+    global violations
+    data = ViolationData(VIOLATIONS_FILE)
+    data.similarity_index
+    violations = data
+    if preload_figures:
+        figures.warm()
+
+def warm_up_stages():
+    data = violations
+    stages = {'similarity index': lambda: data.similarity_index}
+    if preload_figures:
+        stages['figures'] = figures.warm
+    return stages
+
+def create_layout():
+    data = violations
+    return html.Div(style={
         'backgroundColor': '#000000', 
         'padding': '20px',
         'minHeight': '100vh',
@@ -139,7 +190,7 @@ try:
                 html.Label('Select Month:', style={'fontWeight': 'bold', 'color': '#FF00FF'}),
                 dcc.Dropdown(
                     id='month-selector',
-                    options=[{'label': date.strftime('%B %Y'), 'value': i} for i, date in enumerate(df['month'])],
+                    options=[{'label': date.strftime('%B %Y'), 'value': i} for i, date in enumerate(data.df['month'])],
                     value=0,
                     style={'width': '100%', 'backgroundColor': '#000000', 'color': 'black'}
                 )
@@ -177,7 +228,20 @@ try:
                 'overflowY': 'scroll'
             }, children=[
                 html.H3('Pattern Similarity Results', style={'color': '#FF00FF'}),
-                html.Div(id='similarity-results', style={'display': 'flex', 'flexDirection': 'column', 'gap': '10px'})
+                # Paged on the server: only the visible page of the ranking is sent
+                dash_table.DataTable(
+                    id='similarity-results',
+                    columns=[{'name': 'Month', 'id': 'Month'}, {'name': 'Similarity', 'id': 'Similarity'}],
+                    page_action='custom',
+                    page_current=0,
+                    page_size=SIMILARITY_PAGE_SIZE,
+                    style_header={'backgroundColor': '#111111', 'color': '#FF00FF', 'fontWeight': 'bold',
+                                  'border': '1px solid #333'},
+                    style_cell={'backgroundColor': '#000000', 'color': '#FFFFFF', 'border': '1px solid #333',
+                                'fontFamily': 'Space Grotesk, sans-serif', 'padding': '10px', 'textAlign': 'left'}
+                ),
+                # Month the table is showing, so a new month can start again from page one
+                dcc.Store(id='similarity-month')
             ])
         ]),
         
@@ -206,18 +270,33 @@ try:
         ])
     ])
 
+def create_app(watch_interval=WATCH_INTERVAL, warm_figures=False, **dash_kwargs):
+    """Violations dashboard over viola.json, loaded on the first call; dash_kwargs go to the Dash constructor"""
+    global violations, watcher, warm_up, preload_figures
+    if violations is None:
+        violations = ViolationData(VIOLATIONS_FILE)
+    app = Dash(__name__, **dash_kwargs)
+    app.layout = create_layout
+    register_stats_route(app.server, [figures])
+    data_version = lambda: (os.path.abspath(VIOLATIONS_FILE), violations.version)
+
+    # Rebuild the snapshot in the background whenever viola.json changes
+    if watch_interval and watcher is None:
+        watcher = DataWatcher([VIOLATIONS_FILE], reload_data, watch_interval).start()
+
     @app.callback(
-        [Output('pareto-chart', 'figure'),
-        Output('similarity-results', 'children')],
+        Output('pareto-chart', 'figure'),
         [Input('month-selector', 'value')]
     )
+    @figures.cached(data_version, inputs=lambda: [range(len(violations.df))])
     def update_graphs(selected_idx):
+        data = violations
         if selected_idx is None:
             selected_idx = 0
             
         # Prepare Pareto chart data
-        selected_fingerprint = fingerprints.iloc[selected_idx]
-        selected_date = df['month'].iloc[selected_idx]
+        selected_fingerprint = data.fingerprints.iloc[selected_idx]
+        selected_date = data.df['month'].iloc[selected_idx]
         
         sorted_fingerprint = selected_fingerprint.sort_values(ascending=False)
         
@@ -245,41 +324,54 @@ try:
             font_color='#FFFFFF'
         )
         
-        # Prepare similarity results data
-        similarities = similarity_matrix[selected_idx]
-        similarity_df = pd.DataFrame({
-            'Month': df['month'].dt.strftime('%B %Y'),
-            'Similarity': similarities * 100
+        return pareto_fig
+
+    # One callback owns the page: a new month both resets it to the first page and
+    # fills it, so the ranking is computed once per change
+    @app.callback(
+        [Output('similarity-results', 'data'),
+         Output('similarity-results', 'page_count'),
+         Output('similarity-results', 'page_current'),
+         Output('similarity-month', 'data')],
+        [Input('month-selector', 'value'),
+         Input('similarity-results', 'page_current'),
+         Input('similarity-results', 'page_size')],
+        [State('similarity-month', 'data')]
+    )
+    def update_similarity_results(selected_idx, page_current, page_size, shown_idx=None):
+        data = violations
+        if selected_idx is None:
+            selected_idx = 0
+        if shown_idx is not None and shown_idx != selected_idx:
+            page_current = 0
+        page_current = page_current or 0
+        page_size = page_size or SIMILARITY_PAGE_SIZE
+
+        # An IVF index only ranks the months in its probed lists, so count those, not every month
+        available = data.similarity_index.reachable(selected_idx)
+        # Only rank as far as the requested page reaches
+        stop = min((page_current + 1) * page_size, available)
+        ranked_idx, similarities = data.similarity_index.ranked(selected_idx, limit=stop)
+        start = page_current * page_size
+        page = pd.DataFrame({
+            'Month': data.month_labels[ranked_idx[start:stop]],
+            'Similarity': [f"{value:.2f}%" for value in similarities[start:stop] * 100]
         })
-        
-        similarity_df = similarity_df.sort_values('Similarity', ascending=False)
-        
-        similarity_results = [
-            html.Div(style={
-                'backgroundColor': '#111111',
-                'padding': '10px',
-                'borderRadius': '5px',
-                'border': '1px solid #333',
-                'color': '#FFFFFF'
-            }, children=[
-                html.H4(f"{row['Month']}", style={'margin': '0'}),
-                html.P(f"Similarity: {row['Similarity']:.2f}%", style={'margin': '0'})
-            ])
-            for _, row in similarity_df.iterrows()
-        ]
-        
-        return pareto_fig, similarity_results
+        return page.to_dict('records'), math.ceil(available / page_size), page_current, selected_idx
 
     @app.callback(
         Output('monthly-violation-line-chart', 'figure'),
         [Input('violation-type-selector', 'value')]
     )
+    @figures.cached(data_version, inputs=lambda: [list(violation_names)])
     def update_monthly_violation_line_chart(selected_violation):
+        df = violations.df
         if selected_violation not in df.columns:
             return go.Figure()  # Return an empty figure if column is missing
         
         monthly_data = df.groupby([df['month'].dt.year, df['month'].dt.month])[selected_violation].sum().unstack(level=0)
-        fig = px.line(monthly_data, title=f'Monthly {violation_names[selected_violation]} Violations')
+        # Past 1000 points px.line switches to WebGL, which has no spline lines
+        fig = px.line(monthly_data, title=f'Monthly {violation_names[selected_violation]} Violations', render_mode='svg')
         
         fig.update_traces(line=dict(width=4, shape='spline'))  # Thicker and smoother lines
         
@@ -297,14 +389,26 @@ try:
         )
         
         return fig
-    
-    if __name__ == '__main__':
+
+    # Figures are drawn again after each reload once warm_figures is set
+    preload_figures = preload_figures or warm_figures
+    warm_up = WarmUp(warm_up_stages()).start()
+    register_ready_route(app.server, warm_up)
+
+    return app
+
+
+if __name__ == '__main__':
+    try:
+        # Initialize the Dash app
+        app = create_app()
+        warm_up.wait()
         print("\nStarting server...")
         print("Once the server starts, open your web browser and go to: http://127.0.0.1:8050")
         app.run_server(debug=True)
 
-except Exception as e:
-    print(f"\nAn error occurred: {str(e)}")
-    import traceback
-    print("\nFull error information:")
-    print(traceback.format_exc())
\ No newline at end of file
+    except Exception as e:
+        print(f"\nAn error occurred: {str(e)}")
+        import traceback
+        print("\nFull error information:")
+        print(traceback.format_exc())
\ No newline at end of file
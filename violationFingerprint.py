@@ -2,9 +2,9 @@ import pandas as pd
 import numpy as np
 from dash import Dash, dcc, html, Input, Output
 import plotly.graph_objects as go
-from sklearn.metrics.pairwise import cosine_similarity
 import plotly.express as px
 import json
+from fingerprint_similarity import FingerprintIndex
 
 def load_json_data(filename):
     """Load data from JSON file and clean it"""
@@ -89,8 +89,9 @@ try:
     print("\nChecking for NaN values in fingerprints:")
     print(fingerprints.isna().sum())
     
-    print("\nCalculating similarity matrix...")
-    similarity_matrix = cosine_similarity(fingerprints)
+    print("\nIndexing fingerprints...")
+    similarity_index = FingerprintIndex(fingerprints)
+    month_labels = df['month'].dt.strftime('%B %Y').to_numpy()
 
     # App layout
     app.layout = html.Div([
@@ -177,14 +178,13 @@ try:
         )
         
         # Prepare similarity chart data
-        similarities = similarity_matrix[selected_idx]
+        # Most similar last, so the best match sits at the top of the horizontal bars
+        ranked_idx, similarities = similarity_index.ranked(selected_idx)
         similarity_df = pd.DataFrame({
-            'Month': df['month'].dt.strftime('%B %Y'),
-            'Similarity': similarities * 100
+            'Month': month_labels[ranked_idx[::-1]],
+            'Similarity': similarities[::-1] * 100
         })
         
-        similarity_df = similarity_df.sort_values('Similarity', ascending=True)
-        
         similarity_fig = px.bar(
             similarity_df,
             x='Similarity',
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class WarmUp:
+    """Named startup stages run in parallel on a thread pool, each one timed
+
+    A stage is any callable; work that depends on other work belongs in
+    the same stage. A failed stage is reported but still counts as
+    finished, since the dashboard then just does that work on the first
+    request. A stage that returns another WarmUp (e.g. a section with
+    stages of its own) has that progress nested under it in status().
+    """
+
+    def __init__(self, stages, max_workers=None):
+        self.stages = dict(stages)
+        self.max_workers = max_workers or max(1, min(len(self.stages), os.cpu_count() or 1))
+        self.state = {name: 'pending' for name in self.stages}
+        self.seconds = {}
+        self.errors = {}
+        self.results = {}
+        self.started = None
+        self.total = None
+        self._done = threading.Event()
+        self._thread = None
+
+    def _run_stage(self, name):
+        self.state[name] = 'running'
+        start = time.perf_counter()
+        try:
+            self.results[name] = self.stages[name]()
+        except Exception as e:
+            self.state[name] = 'failed'
+            self.errors[name] = str(e)
+            print(f"Warning: Warm-up stage {name} failed: {e}")
+        else:
+            self.state[name] = 'done'
+        self.seconds[name] = time.perf_counter() - start
+
+    def run(self):
+        """Run every stage and block until all have finished"""
+        self.started = time.perf_counter()
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix='warm-up') as pool:
+            list(pool.map(self._run_stage, self.stages))
+        self.total = time.perf_counter() - self.started
+        self._done.set()
+        return self
+
+    def start(self):
+        """Run the stages on a background thread and return at once"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='warm-up', daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def status(self):
+        stages = {}
+        for name in self.stages:
+            stage = {'state': self.state[name], 'seconds': round(self.seconds[name], 3) if name in self.seconds else None}
+            if name in self.errors:
+                stage['error'] = self.errors[name]
+            if isinstance(self.results.get(name), WarmUp):
+                stage['stages'] = self.results[name].status()['stages']
+            stages[name] = stage
+        elapsed = self.total if self.total is not None else (
+            time.perf_counter() - self.started if self.started is not None else 0)
+        return {'ready': self.ready, 'pid': os.getpid(), 'seconds': round(elapsed, 3), 'stages': stages}
+
+
+def register_ready_route(server, warm_up, route='/ready'):
+    """Serve warm-up progress on the Flask server: 200 once every stage has finished, 503 until then
+
+    The WarmUp is also kept in server.extensions['warm_up'] so an app
+    mounting this one can wait on it.
+    """
+    from flask import jsonify
+
+    server.extensions['warm_up'] = warm_up
+
+    def ready():
+        status = warm_up.status()
+        return jsonify(status), 200 if status['ready'] else 503
+
+    server.add_url_rule(route, 'ready', ready)
@@ -0,0 +1,37 @@
+import numpy as np
+
+
+class YearIndex:
+    """Year -> contiguous row range over a frame sorted by its year column
+
+    Slicing a year is then a positional iloc slice, which pandas hands out
+    without building a full-length boolean mask or copying the rows.
+    """
+
+    def __init__(self, df, column):
+        self.column = column
+        years = df[column]
+        present = int(years.notna().sum())
+        if years.iloc[:present].is_monotonic_increasing and years.iloc[present:].isna().all():
+            # Already sorted (e.g. mapped from the data plane): keep the columns instead of copying them
+            self.frame = df.reset_index(drop=True)
+        else:
+            self.frame = df.sort_values(column, kind='stable', na_position='last').reset_index(drop=True)
+
+        values = self.frame[column].to_numpy()
+        starts = np.concatenate(([0], np.flatnonzero(values[1:present] != values[:present - 1]) + 1)) if present else []
+        stops = list(starts[1:]) + [present] if present else []
+        # Plain ints, whether the column is int16, float or nullable Int16
+        self.ranges = {int(values[start]): (int(start), int(stop)) for start, stop in zip(starts, stops)}
+
+    @property
+    def years(self):
+        return sorted(self.ranges)
+
+    def __contains__(self, year):
+        return year in self.ranges
+
+    def slice(self, year):
+        """Rows for one year (empty when the year is unknown)"""
+        start, stop = self.ranges.get(year, (0, 0))
+        return self.frame.iloc[start:stop]
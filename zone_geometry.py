@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from data_version import file_version
+
+# Douglas-Peucker tolerances in degrees (0.0001 deg is roughly 11 m in Doha).
+# A level with tolerance 0 keeps the source coordinates as float64, neither simplified nor quantized
+LOD_TOLERANCES = {
+    'full': 0.0,
+    'high': 0.00002,
+    'medium': 0.0001,
+    'low': 0.0005,
+}
+QUANTIZE_BITS = 16
+
+# Bump whenever the .npz layout changes so stale files get rebuilt
+LOD_FORMAT = 2
+
+
+def detail_for_zoom(zoom):
+    """Pick the coarsest level of detail that still looks right at a Leaflet zoom level"""
+    if zoom <= 9:
+        return 'low'
+    if zoom <= 12:
+        return 'medium'
+    if zoom <= 14:
+        return 'high'
+    return 'full'
+
+
+def read_polygons(polygons_file):
+    """Zone id -> (n, 2) array of (lat, lng) from the pretty-printed polygons JSON"""
+    with open(polygons_file, 'r') as f:
+        zones = json.load(f)
+    return {
+        zone_id: np.array([[p['lat'], p['lng']] for p in zone['coordinates']], dtype=np.float64)
+        for zone_id, zone in zones.items()
+    }
+
+
+class ZoneStore:
+    """Every zone ring in one contiguous float32 (lat, lng) array, sliced by offsets"""
+
+    def __init__(self, coords, offsets, zone_ids):
+        self.coords = coords
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.zone_ids = [str(z) for z in zone_ids]
+        self._index = {zone_id: i for i, zone_id in enumerate(self.zone_ids)}
+
+    def get_zone(self, zone_id):
+        """(n, 2) view into the shared coordinate array, or None for unknown zones"""
+        i = self._index.get(str(zone_id))
+        if i is None:
+            return None
+        return self.coords[self.offsets[i]:self.offsets[i + 1]]
+
+    def __contains__(self, zone_id):
+        return str(zone_id) in self._index
+
+    def __iter__(self):
+        return iter(self.zone_ids)
+
+    def __len__(self):
+        return len(self.zone_ids)
+
+    def __getitem__(self, zone_id):
+        ring = self.get_zone(zone_id)
+        if ring is None:
+            raise KeyError(zone_id)
+        return ring
+
+    def items(self):
+        return ((zone_id, self.get_zone(zone_id)) for zone_id in self.zone_ids)
+
+
+def store_dir(polygons_file):
+    path = Path(polygons_file)
+    return path.with_name(path.stem + '_store')
+
+
+def write_zone_store(polygons, out_dir, source):
+    """Write the rings as coords.<source>.npy plus a meta.json holding the offsets"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    zone_ids = sorted(polygons, key=lambda z: int(z) if z.isdigit() else z)
+    coords = np.concatenate([polygons[z] for z in zone_ids]).astype(np.float32)
+    offsets = np.cumsum([0] + [len(polygons[z]) for z in zone_ids])
+
+    # The coordinate file name carries the source version and meta.json is
+    # swapped in last, so readers always see a matching pair
+    coords_name = f'coords.{source}.npy'
+    tmp = out_dir / f'{coords_name}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, coords)
+    os.replace(tmp, out_dir / coords_name)
+
+    meta = {'source': source, 'coords_file': coords_name,
+            'zone_ids': zone_ids, 'offsets': offsets.tolist()}
+    tmp = out_dir / f'meta.json.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, out_dir / 'meta.json')
+
+    # Old coordinate files can go; processes that still map them keep their pages
+    for old in out_dir.glob('coords.*.npy'):
+        if old.name != coords_name:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+def open_zone_store(out_dir, source=None):
+    """Memory-map a zone store; returns None when it is missing or built from another source"""
+    out_dir = Path(out_dir)
+    try:
+        with open(out_dir / 'meta.json', 'r') as f:
+            meta = json.load(f)
+        if source is not None and meta['source'] != source:
+            return None
+        coords = np.load(out_dir / meta['coords_file'], mmap_mode='r')
+    except (OSError, KeyError, ValueError):
+        return None
+    return ZoneStore(coords, meta['offsets'], meta['zone_ids'])
+
+
+def load_zone_store(polygons_file, out_dir=None):
+    """Shared, memory-mapped zone geometry, rebuilt from the JSON only when it has changed"""
+    out_dir = out_dir or store_dir(polygons_file)
+    source = file_version(polygons_file)
+    store = open_zone_store(out_dir, source)
+    if store is not None:
+        return store
+
+    polygons = read_polygons(polygons_file)
+    try:
+        write_zone_store(polygons, out_dir, source)
+        store = open_zone_store(out_dir, source)
+    except OSError as e:
+        print(f"Warning: Could not write zone store: {e}")
+    if store is None:
+        zone_ids = list(polygons)
+        coords = np.concatenate([polygons[z] for z in zone_ids]).astype(np.float32)
+        store = ZoneStore(coords, np.cumsum([0] + [len(polygons[z]) for z in zone_ids]), zone_ids)
+    return store
+
+
+def simplify(points, tolerance):
+    """Douglas-Peucker simplification of a closed ring of (lat, lng) points"""
+    n = len(points)
+    if tolerance <= 0 or n <= 4:
+        return points
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        inner = points[start + 1:end]
+        a = points[start]
+        direction = points[end] - a
+        length = np.hypot(direction[0], direction[1])
+        if length == 0:
+            # Closed rings start and end on the same vertex
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dist = np.abs(direction[0] * (inner[:, 1] - a[1]) - direction[1] * (inner[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+
+    simplified = points[keep]
+    # Never collapse a zone below a triangle
+    return simplified if len(simplified) >= 4 else points
+
+
+def quantize(points, translate, scale):
+    q = np.rint((points - translate) / scale).astype(np.uint16)
+    # Drop vertices that landed on the same grid cell as their predecessor
+    if len(q) > 1:
+        moved = np.any(q[1:] != q[:-1], axis=1)
+        q = q[np.concatenate(([True], moved))]
+    return q
+
+
+def build_lod(polygons, tolerances=LOD_TOLERANCES, bits=QUANTIZE_BITS):
+    """Simplify every zone at each tolerance and quantize onto a shared integer grid
+
+    Levels with tolerance 0 are stored exactly, so 'full' is lossless.
+    """
+    zone_ids = sorted(polygons, key=lambda z: int(z) if z.isdigit() else z)
+    all_points = np.concatenate([polygons[z] for z in zone_ids]).astype(np.float64)
+    translate = all_points.min(axis=0)
+    extent = all_points.max(axis=0) - translate
+    scale = np.where(extent > 0, extent / (2 ** bits - 1), 1.0)
+
+    arrays = {
+        'zone_ids': np.array(zone_ids),
+        'translate': translate,
+        'scale': scale,
+        'levels': np.array(list(tolerances)),
+    }
+    for level, tolerance in tolerances.items():
+        points = [np.asarray(polygons[z], dtype=np.float64) for z in zone_ids]
+        if tolerance <= 0:
+            rings = points
+        else:
+            rings = [quantize(simplify(ring, tolerance), translate, scale) for ring in points]
+        arrays[f'{level}_coords'] = np.concatenate(rings)
+        arrays[f'{level}_offsets'] = np.cumsum([0] + [len(r) for r in rings]).astype(np.int64)
+    return arrays
+
+
+class ZoneLOD:
+    """Zone polygons at several levels of detail, quantized except for the exact level"""
+
+    def __init__(self, arrays):
+        self.zone_ids = [str(z) for z in arrays['zone_ids']]
+        self.translate = np.asarray(arrays['translate'], dtype=np.float64)
+        self.scale = np.asarray(arrays['scale'], dtype=np.float64)
+        self.levels = [str(level) for level in arrays['levels']]
+        self._index = {zone_id: i for i, zone_id in enumerate(self.zone_ids)}
+        self._coords = {level: arrays[f'{level}_coords'] for level in self.levels}
+        self._offsets = {level: arrays[f'{level}_offsets'] for level in self.levels}
+
+    def __contains__(self, zone_id):
+        return str(zone_id) in self._index
+
+    def get(self, zone_id, level='medium', decimals=6):
+        """[[lat, lng], ...] for a zone at the given level, or None for unknown zones"""
+        i = self._index.get(str(zone_id))
+        if i is None:
+            return None
+        offsets = self._offsets[level]
+        q = self._coords[level][offsets[i]:offsets[i + 1]]
+        points = q if q.dtype.kind == 'f' else q * self.scale + self.translate
+        return np.round(points, decimals).tolist()
+
+    def vertex_count(self, level):
+        return len(self._coords[level])
+
+    def to_geojson(self, level='medium', decimals=6):
+        """FeatureCollection of every zone, with the zone id as feature id"""
+        features = []
+        for zone_id in self.zone_ids:
+            # GeoJSON wants (lng, lat)
+            ring = [[lng, lat] for lat, lng in self.get(zone_id, level, decimals)]
+            features.append({
+                'type': 'Feature',
+                'id': zone_id,
+                'properties': {},
+                'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            })
+        return {'type': 'FeatureCollection', 'features': features}
+
+
+def lod_path(polygons_file):
+    path = Path(polygons_file)
+    return path.with_name(path.stem + '_lod.npz')
+
+
+def write_lod(arrays, out_file, source):
+    out_file = Path(out_file)
+    tmp = out_file.with_name(f'{out_file.name}.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(f, source=np.array(source), format=np.array(LOD_FORMAT), **arrays)
+    os.replace(tmp, out_file)
+
+
+def load_zone_lod(polygons_file, lod_file=None):
+    """Load the prebuilt LOD store, rebuilding it when the polygons file has changed"""
+    lod_file = lod_file or lod_path(polygons_file)
+    source = file_version(polygons_file)
+    try:
+        with np.load(lod_file) as data:
+            if str(data['source']) == source and int(data['format']) == LOD_FORMAT:
+                return ZoneLOD({key: data[key] for key in data.files})
+    except (OSError, KeyError, ValueError):
+        pass
+
+    # Built from the JSON rather than the float32 store so the full level stays exact
+    arrays = build_lod(read_polygons(polygons_file))
+    try:
+        write_lod(arrays, lod_file, source)
+    except OSError as e:
+        print(f"Warning: Could not write zone LOD file: {e}")
+    return ZoneLOD(arrays)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the binary zone store and the simplified levels of detail')
+    parser.add_argument('polygons_file', nargs='?', default='qatar_zones_polygons.json')
+    parser.add_argument('--out', help='output .npz (default: <polygons>_lod.npz)')
+    args = parser.parse_args()
+
+    source = file_version(args.polygons_file)
+    write_zone_store(read_polygons(args.polygons_file), store_dir(args.polygons_file), source)
+    print(f"Wrote {store_dir(args.polygons_file)}")
+
+    out_file = args.out or lod_path(args.polygons_file)
+    arrays = build_lod(read_polygons(args.polygons_file))
+    write_lod(arrays, out_file, source)
+
+    lod = ZoneLOD(arrays)
+    for level in lod.levels:
+        print(f"{level:>6}: {lod.vertex_count(level)} vertices")
+    print(f"Wrote {out_file} ({os.path.getsize(out_file)} bytes)")